@@ -10,39 +10,61 @@ else:
 import math
 import time
 import random
+import os
+import mmap
+import json
+import hashlib
+import sqlite3
+import bisect
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 
 # Used to compute the bandwidth for banded version
 MAXINDELS = 3
 
+# Sub-problems with at most this many cells are aligned with the packed matrix in linear space mode. At 2 bits a cell
+# that is 1 MB however long the sequences are, and it saves the deeper levels of the recursion, whose short rows cost
+# more per cell to fill
+HIRSCHBERG_BASE_CELLS = 1 << 22
+
+# How many columns of scores under the middle row hirschbergOperations keeps, so it only has to fill a narrow strip
+# again to find the scores of the column it splits at. Costs this many int32s per row
+HIRSCHBERG_CHECKPOINTS = 32
+
+# Where align_all_pairs keeps results between runs. Bump ALIGN_CACHE_VERSION whenever a change could make align
+# return something different, or change what alignmentKey hashes, so results from older code are not reused
+ALIGN_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'gene_sequencing_alignments.sqlite')
+ALIGN_CACHE_VERSION = 2
+
+# writeString makes at most 101 edits, each moving later characters by at most 2 places, so nothing past this many
+# characters can reach the first 100 it shows
+WRITE_PREFIX = 100 + 2 * 101
+
 # Used to implement Needleman-Wunsch scoring
 MATCH = -3
 INDEL = 5
 SUB = 1
 
 
-# O(n) time. The code loops through the back pointers, puts them into a queue and then pops them off and makes the
-# string to have up to 100 characters
-# O(n) space complexity. The back pointers grow as the sequences grow up to align_length
-def writeString(seq1, seq2, dp_matrix, num_rows, num_cols):
-    operations = []
-    current = dp_matrix[num_rows - 1][num_cols - 1]
-    while True:
-        if current.back is None:
-            break
-        if current.back.col < current.col:
-            if current.back.row < current.row:
-                operations.append("d")
-            else:
-                operations.append("l")
-        else:
-            operations.append("u")
-        current = current.back
+# How many rows apart the max_cost cutoff is checked, so checking costs little next to filling the rows
+CUTOFF_INTERVAL = 16
+
+
+# Back pointer codes stored in the compact unbanded direction matrix, 2 bits per cell
+LEFT = 0
+UP = 1
+DIAG = 2
+
+
+# O(n) time. Takes the operations of an alignment in order from the start ('l' for a gap in seq1, 'u' for a gap in
+# seq2, 'd' for a match or substitution) and inserts the gaps into the strings for up to the first 100 characters
+# O(n) space complexity
+def writeString(seq1, seq2, operations):
+    seq1 = textPrefix(seq1)
+    seq2 = textPrefix(seq2)
     i = 0
-    while i <= 100:
-        if len(operations) == 0:
-            break
-        op = operations.pop(-1)
+    for op in operations[:101]:
         if op == 'l':
             seq1 = seq1[:i] + '-' + seq1[i:]
         elif op == 'u':
@@ -52,84 +74,683 @@ def writeString(seq1, seq2, dp_matrix, num_rows, num_cols):
     return seq1, seq2
 
 
-# O(n) time. The code loops through the back pointers, puts them into a queue and then pops them off and makes the
-# string to have up to 100 characters. Same as above but for the banded array
-# O(n) space complexity. The back pointers grow as the sequences grow up to align_length
-def bandedWriteString(seq1, seq2, dp_matrix, prev_matrix, num_rows, num_cols):
+# Run length codes of cigarOperations, as in extended CIGAR: seq2 is the reference and seq1 the sequence aligned to it
+CIGAR_MATCH = '='
+CIGAR_MISMATCH = 'X'
+CIGAR_INSERT = 'I'
+CIGAR_DELETE = 'D'
+
+
+# O(n) time and space. Run length encodes the operations of an alignment of codes1 against codes2 as a list of
+# (code, count) pairs: a diagonal step is a CIGAR_MATCH or a CIGAR_MISMATCH, a character of seq1 against a gap
+# ('u') a CIGAR_INSERT and a character of seq2 against a gap ('l') a CIGAR_DELETE. The runs are found with whole
+# array operations, so there is no Python work per character
+def cigarOperations(codes1, codes2, operations):
+    ops = np.frombuffer(''.join(operations).encode(), dtype=np.uint8)
+    if len(ops) == 0:
+        return []
+    diag = ops == ord('d')
+    steps1 = diag | (ops == ord('u'))
+    steps2 = diag | (ops == ord('l'))
+    # Position in each sequence of the character each step uses
+    i = np.cumsum(steps1) - 1
+    j = np.cumsum(steps2) - 1
+    kinds = np.where(ops == ord('u'), 1, np.where(ops == ord('l'), 2, 3)).astype(np.uint8)
+    matched = codes1[i[diag]] == codes2[j[diag]]
+    kinds[diag] = np.where(matched, 0, 3)
+    starts = np.flatnonzero(np.concatenate(([True], kinds[1:] != kinds[:-1])))
+    counts = np.diff(np.append(starts, len(kinds)))
+    codes = (CIGAR_MATCH, CIGAR_INSERT, CIGAR_DELETE, CIGAR_MISMATCH)
+    return [(codes[kind], int(count)) for kind, count in zip(kinds[starts], counts)]
+
+
+# O(r). The runs of cigarOperations as a CIGAR string, like '12=1X2I30='
+def cigarString(cigar):
+    return ''.join('{}{}'.format(count, code) for code, count in cigar)
+
+
+# O(n) time in all and O(chunk_size) space per chunk. Yields the whole alignment that cigar describes as pairs of
+# gapped strings chunk_size columns long (the last may be shorter), for seq1 and seq2 given as strings or byte code
+# arrays. Unlike seqi_first100 and seqj_first100, every character is shown in its column
+def renderAlignment(seq1, seq2, cigar, chunk_size=100):
+    i = 0
+    j = 0
+    top = []
+    bottom = []
+    width = 0
+    for code, count in cigar:
+        while count > 0:
+            take = min(count, chunk_size - width)
+            if code == CIGAR_INSERT:
+                top.append(sequenceText(seq1[i:i + take]))
+                bottom.append('-' * take)
+                i += take
+            elif code == CIGAR_DELETE:
+                top.append('-' * take)
+                bottom.append(sequenceText(seq2[j:j + take]))
+                j += take
+            else:
+                top.append(sequenceText(seq1[i:i + take]))
+                bottom.append(sequenceText(seq2[j:j + take]))
+                i += take
+                j += take
+            width += take
+            count -= take
+            if width == chunk_size:
+                yield ''.join(top), ''.join(bottom)
+                top = []
+                bottom = []
+                width = 0
+    if width:
+        yield ''.join(top), ''.join(bottom)
+
+
+# A sequence given as a string or a byte code array, as a string
+def sequenceText(seq):
+    if isinstance(seq, np.ndarray):
+        return seq.tobytes().decode('ascii')
+    return seq
+
+
+# O(1). The first WRITE_PREFIX characters of a sequence as a string, which is all writeString needs. Byte code arrays
+# (see readFasta) are only decoded that far
+def textPrefix(seq):
+    return sequenceText(seq[:WRITE_PREFIX])
+
+
+# Reads a FASTA file as a list of (name, codes) pairs, where codes is a uint8 array of the byte codes of a
+# sequence's bases, which align takes in place of a string. The file is memory mapped rather than read: a sequence
+# written on one line is a view straight into the mapping, so nothing is copied or loaded until it is aligned, and
+# only a sequence wrapped over several lines is copied, to take out its line breaks. O(r) time for r records plus
+# O(n) for each wrapped sequence of n bases
+def readFasta(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data = np.frombuffer(mapped, dtype=np.uint8)
+    records = []
+    start = mapped.find(b'>')
+    while start != -1:
+        header_end = mapped.find(b'\n', start)
+        if header_end == -1:
+            header_end = len(mapped)
+        end = mapped.find(b'\n>', header_end)
+        next_start = end + 1 if end != -1 else -1
+        if end == -1:
+            end = len(mapped)
+        name = mapped[start + 1:header_end].decode().strip()
+        records.append((name, fastaBases(mapped, data, min(header_end + 1, end), end)))
+        start = next_start
+    return records
+
+
+# The bases of one FASTA record, held in bytes begin..end of the file, without the surrounding whitespace or line
+# breaks. A view into data when the bases are all on one line
+def fastaBases(mapped, data, begin, end):
+    while end > begin and mapped[end - 1] in b' \t\r\n':
+        end -= 1
+    while begin < end and mapped[begin] in b' \t\r\n':
+        begin += 1
+    bases = data[begin:end]
+    if mapped.find(b'\n', begin, end) == -1 and mapped.find(b'\r', begin, end) == -1:
+        return bases
+    return bases[(bases != ord('\n')) & (bases != ord('\r'))]
+
+
+# O(n) time and space. Turns a sequence into an array of byte codes so whole rows can be compared at once
+def encodeSequence(seq):
+    if isinstance(seq, np.ndarray):
+        return seq
+    return np.frombuffer(seq.encode(), dtype=np.uint8)
+
+
+# O(n) time and space. Packs an array of 2 bit back pointer codes 4 to a byte
+def packDirections(directions):
+    padded = np.zeros(-(-len(directions) // 4) * 4, dtype=np.uint8)
+    padded[:len(directions)] = directions
+    quads = padded.reshape(-1, 4)
+    return quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+
+
+# O(1). Reads the back pointer code of column j out of a packed row
+def directionAt(packed_row, j):
+    return (int(packed_row[j >> 2]) >> ((j & 3) << 1)) & 3
+
+
+# O(kn) time and space for the k distinct characters of codes1. Returns, for every character of codes1, a row number
+# into a table whose rows hold the MATCH or SUB cost of that character against each character of codes2. Slices of
+# the table line up with slices of codes2, so sub-problems can share it
+def substitutionTable(codes1, codes2):
+    letters, rows = np.unique(codes1, return_inverse=True)
+    table = np.where(codes2[np.newaxis, :] == letters[:, np.newaxis], MATCH, SUB).astype(np.int32)
+    return rows, table
+
+
+# O(n) time and space. Computes row i of the unbanded matrix from row i - 1, where costs holds the MATCH or SUB cost
+# of character i of seq1 against every character of seq2 and steps is INDEL * j for every column j. The first cell
+# is given (INDEL * i for a whole matrix) and every other cell takes the cheapest of
+#   left: cur[j - 1] + INDEL, up: prev[j] + INDEL, diag: prev[j - 1] + MATCH or SUB
+# with the same precedence as the original Node version: diag only if it is strictly cheaper than both, then up
+# only if it is strictly cheaper than left. Left depends on the row being filled, but
+# cur[j] = min over k <= j of (best of up and diag at k) + INDEL * (j - k), which is a running minimum.
+# Returns the scores and the back pointer codes of the row
+def fillRow(prev, costs, first, steps):
+    cur, up, diag = fillScores(prev, costs, first, steps)
+    left = cur[:-1] + INDEL
+    directions = np.empty(len(prev), dtype=np.uint8)
+    directions[0] = UP
+    directions[1:] = np.where(diag < np.minimum(left, up), DIAG, np.where(up < left, UP, LEFT))
+    return cur, directions
+
+
+# O(n) time and space. The score half of fillRow. Returns the new row along with the up and diag candidates
+def fillScores(prev, costs, first, steps):
+    up = prev[1:] + INDEL
+    diag = prev[:-1] + costs
+    best = np.empty_like(prev)
+    best[0] = first
+    np.minimum(up, diag, out=best[1:])
+    best -= steps
+    np.minimum.accumulate(best, out=best)
+    best += steps
+    return best, up, diag
+
+
+# O(n) time and space. fillRow for the rows under the middle row in hirschbergOperations: instead of the back pointers
+# it returns, for each cell, the column where the traceback from that cell leaves the middle row. A diag or up cell
+# takes the exit of the cell it points to in the row above, a left cell takes the exit of the nearest cell to its
+# left that is not a left cell, which is another running maximum over column numbers. With fillRow's precedence a
+# cell is a left cell exactly when its score is INDEL more than the cell to its left, and any other cell is a diag
+# cell when diag is below up, so neither needs the left candidates. Both choices are made by multiplying with the
+# masks rather than with np.where, which is several times slower on masks that change from cell to cell
+def fillExits(prev, costs, first, steps, exits, columns):
+    cur, up, diag = fillScores(prev, costs, first, steps)
+    source = np.empty_like(exits)
+    source[0] = exits[0]
+    source[1:] = exits[1:] - np.diff(exits) * (diag < up)
+    starts = np.empty_like(columns)
+    starts[0] = 0
+    np.multiply(columns[1:], np.diff(cur) != INDEL, out=starts[1:])
+    np.maximum.accumulate(starts, out=starts)
+    return cur, source.take(starts)
+
+
+# O(mn) time and O(mn / 4) space. Aligns a block of the matrix given the scores of its top row and left column:
+# rows[i] is the substitution table row of the i-th character of seq1 in the block and table has one column per
+# character of seq2 in it. Every cell gets the same back pointer it has in the whole matrix, so the operations
+# returned are that part of the full traceback. With max_cost set (only meaningful for a whole matrix) it returns
+# inf and None once pastCutoff says the alignment will cost more than that
+def alignBlock(rows, table, top, left, max_cost=None):
+    num_rows = len(rows) + 1
+    num_cols = table.shape[1] + 1
+    steps = INDEL * np.arange(num_cols, dtype=np.int32)
+    packed = np.empty([num_rows, -(-num_cols // 4)], dtype=np.uint8)
+    row = top
+    for i in range(1, num_rows):
+        row, directions = fillRow(row, table[rows[i - 1]], left[i], steps)
+        packed[i] = packDirections(directions)
+        if max_cost is not None and i % CUTOFF_INTERVAL == 0 and \
+                pastCutoff(row, i, 0, num_rows - 1, num_cols - 1, max_cost):
+            return float("inf"), None
+    if max_cost is not None and row[-1] > max_cost:
+        return float("inf"), None
+    return int(row[-1]), traceback(packed, num_rows, num_cols)
+
+
+# Linear space version of alignBlock that returns the same operations, found by divide and conquer (Hirschberg):
+#   1. Fill down to the middle row keeping only the current row, then keep going to the last row while carrying,
+#      for every cell, the column where the traceback from that cell leaves the middle row. At the last row this
+#      gives the column c where the full traceback crosses the middle row.
+#   2. Get the scores of column c under the middle row. Step 1 also saves the scores of HIRSCHBERG_CHECKPOINTS
+#      evenly spaced columns on the way down, so only the strip between the nearest of those left of c and c itself
+#      has to be filled again, at most 1 / HIRSCHBERG_CHECKPOINTS of the width of the rows below the middle.
+#   3. The top left part (ending at middle row, column c) and the bottom right part (starting there) now both have
+#      known top rows and left columns, so they are aligned the same way and their operations joined.
+# Because every part is given the real scores along its edges, ties are broken exactly as in the full matrix and the
+# alignment is the same one alignBlock finds. O(mn) time and O(m + n) space. Each level fills its block about once
+# (step 1 costs more per row than a plain fill, step 2 a little more), and the levels below it add up to about as
+# much again, so the whole thing takes about twice as long as alignBlock
+def hirschbergOperations(rows, table, top, left):
+    num_rows = len(rows) + 1
+    num_cols = table.shape[1] + 1
+    if num_rows <= 2 or num_cols <= 2 or num_rows * num_cols <= HIRSCHBERG_BASE_CELLS:
+        return alignBlock(rows, table, top, left)[1]
+
+    steps = INDEL * np.arange(num_cols, dtype=np.int32)
+    mid = num_rows // 2
+    row = top
+    for i in range(1, mid):
+        row = fillScores(row, table[rows[i - 1]], left[i], steps)[0]
+    mid_row, directions = fillRow(row, table[rows[mid - 1]], left[mid], steps)
+    columns = np.arange(num_cols, dtype=np.int32)
+    # Where the traceback from each cell of the middle row goes up out of it
+    exits = np.maximum.accumulate(np.where(directions != LEFT, columns, 0))
+    checkpoints = columns[::-(-num_cols // HIRSCHBERG_CHECKPOINTS)]
+    saved = np.empty([num_rows - mid, len(checkpoints)], dtype=np.int32)
+    saved[0] = mid_row[checkpoints]
+    row = mid_row
+    for i in range(mid + 1, num_rows):
+        row, exits = fillExits(row, table[rows[i - 1]], left[i], steps, exits, columns)
+        saved[i - mid] = row[checkpoints]
+    split = int(exits[-1])
+
+    # Column split under the middle row, filled in from the nearest saved column at or before it
+    index = int(np.searchsorted(checkpoints, split, side='right')) - 1
+    start = int(checkpoints[index])
+    column = saved[:, index].copy()
+    if start < split:
+        column[0] = mid_row[split]
+        row = mid_row[start:split + 1]
+        for i in range(mid + 1, num_rows):
+            row = fillScores(row, table[rows[i - 1], start:split], saved[i - mid, index], steps[:split - start + 1])[0]
+            column[i - mid] = row[-1]
+
+    return (hirschbergOperations(rows[:mid], table[:, :split], top[:split + 1], left[:mid + 1]) +
+            hirschbergOperations(rows[mid:], table[:, split:], mid_row[split:], column))
+
+
+# O(n) time. Adds up the cost of an alignment from its operations
+def operationsCost(codes1, codes2, operations):
+    score = 0
+    i = 0
+    j = 0
+    for op in operations:
+        if op == 'd':
+            score += MATCH if codes1[i] == codes2[j] else SUB
+            i += 1
+            j += 1
+        elif op == 'u':
+            score += INDEL
+            i += 1
+        else:
+            score += INDEL
+            j += 1
+    return score
+
+
+# O(n) time. Follows the packed back pointers from the bottom right corner to the top left and returns the
+# operations in order from the start
+def traceback(packed, num_rows, num_cols):
     operations = []
     i = num_rows - 1
-    j = MAXINDELS + len(seq2) - len(seq1)
-    direction = prev_matrix[num_rows - 1][MAXINDELS + len(seq2) - len(seq1)]
-    while True:
-        if direction == "None":
-            break
-        if direction == "left":
+    j = num_cols - 1
+    while i > 0 or j > 0:
+        if i == 0:
+            direction = LEFT
+        elif j == 0:
+            direction = UP
+        else:
+            direction = directionAt(packed[i], j)
+        if direction == LEFT:
             operations.append('l')
-            direction = prev_matrix[i][j - 1]
             j -= 1
-        if direction == "up":
+        elif direction == UP:
             operations.append('u')
-            if i > MAXINDELS:
-                direction = prev_matrix[i - 1][j + 1]
-                i -= 1
-                j += 1
-            else:
-                direction = prev_matrix[i - 1][j]
-                i -= 1
-        if direction == "diag":
+            i -= 1
+        else:
             operations.append('d')
-            if i > MAXINDELS:
-                direction = prev_matrix[i - 1][j]
-                i -= 1
-            else:
-                direction = prev_matrix[i - 1][j - 1]
-                i -= 1
-                j -= 1
-    q = 0
-    while q <= 100:
-        if len(operations) == 0:
-            break
-        op = operations.pop(-1)
-        if op == 'l':
-            seq1 = seq1[:q] + '-' + seq1[q:]
-        elif op == 'u':
-            seq2 = seq2[:q - 1] + '-' + seq2[q + 1:]
-        q += 1
+            i -= 1
+            j -= 1
+    operations.reverse()
+    return operations
 
-    return seq1, seq2
+
+# Length of the k-mers seedCorridor matches between the two sequences, how far apart along seq2 they are looked up,
+# and how many columns on either side of the chained seeds the corridor reaches
+SEED_LENGTH = 16
+SEED_STRIDE = 8
+CORRIDOR_WIDTH = 16
+
+# Multiplier of the rolling k-mer hash. Arithmetic is mod 2^64, so hashes can collide, which at worst costs a
+# misplaced seed
+KMER_BASE = 1000003
+
+# Scores of cells outside the band. Small enough that adding costs to it cannot overflow an int32
+UNREACHABLE = 1 << 29
+
+
+# O(m) time and space. The band of cells within k of the main diagonal: row i covers columns lo[i]..hi[i]
+def bandLimits(num_rows, num_cols, k):
+    i = np.arange(num_rows)
+    return np.maximum(i - k, 0), np.minimum(i + k, num_cols - 1)
+
+
+# O(1). A lower bound on the cost of any alignment of an m and an n character sequence that leaves the band of width
+# k: it needs at least 2(k + 1) - |m - n| indels, and every remaining pair of characters costs at least MATCH
+def bandLowerBound(m, n, k):
+    gaps = 2 * (k + 1) - abs(m - n)
+    return INDEL * gaps + min(MATCH, SUB) * (m + n - gaps) / 2
 
 
-# Called by unbaded matrix. O(1) time complexity. O(1) space complexity. Compares the smallest cost in order of
-# precedence set in the spec.
-def findBackPointer(left, up, diag, a, b):
-    if left is None or left == float("inf"):
-        node = makeNode(100, 100)
-        node.score = float("inf")
-        left = node
-    if up is None or up == float("inf"):
-        node = makeNode(100, 100)
-        node.score = float("inf")
-        up = node
-    if diag is None or diag == float("inf"):
-        node = makeNode(100, 100)
-        node.score = float("inf")
-        diag = node
-    back = left
-    minScore = left.score
-    toAdd = 5
-    if up.score + 5 < minScore + 5:
-        back = up
-        minScore = up.score
-    if a == b:
-        diagVal = -3
-        isMatch = True
+# O(w) time and space for a row of w cells. fillRow for a row that only covers columns lo..hi, given the previous
+# row prev covering columns prev_lo..prev_lo + len(prev) - 1. Cells outside those ranges count as UNREACHABLE, and
+# column 0 is the base case INDEL * i. Same precedence between left, up and diag as fillRow
+def fillBandRow(prev, prev_lo, lo, hi, costs, i):
+    best, up, diag = fillBandScores(prev, prev_lo, lo, hi, costs, i)
+    left = np.empty(len(best), dtype=np.int32)
+    left[0] = UNREACHABLE
+    left[1:] = best[:-1] + INDEL
+    directions = np.where(diag < np.minimum(left, up), DIAG, np.where(up < left, UP, LEFT)).astype(np.uint8)
+    if lo == 0:
+        directions[0] = UP
+    return best, directions
+
+
+# O(w) time and space. The score half of fillBandRow. Returns the new row along with the up and diag candidates
+def fillBandScores(prev, prev_lo, lo, hi, costs, i):
+    width = hi - lo + 1
+    # above[k] is the previous row's score at column lo - 1 + k
+    above = np.full(width + 1, UNREACHABLE, dtype=np.int32)
+    start = max(prev_lo, lo - 1)
+    end = min(prev_lo + len(prev) - 1, hi)
+    if start <= end:
+        above[start - lo + 1:end - lo + 2] = prev[start - prev_lo:end - prev_lo + 1]
+    up = above[1:] + INDEL
+    diag = np.full(width, UNREACHABLE, dtype=np.int32)
+    if lo > 0:
+        diag += above[:-1] + costs[lo - 1:hi] - UNREACHABLE
     else:
-        diagVal = 1
-        isMatch = False
-    if diag.score + diagVal < minScore + 5:
-        back = diag
-        toAdd = diagVal
-    return back, isMatch, toAdd
+        diag[1:] = above[1:-1] + costs[:hi]
+    best = np.minimum(up, diag)
+    if lo == 0:
+        best[0] = INDEL * i
+    steps = INDEL * np.arange(width, dtype=np.int32)
+    best -= steps
+    np.minimum.accumulate(best, out=best)
+    best += steps
+    return best, up, diag
+
+
+# O(w) time and space for w cells in the band. Aligns inside a band given by lo and hi (one entry per row, neither
+# ever decreasing). Scores are two int32 rows and each row's back pointers are packed 4 to a byte. Returns the cost
+# and the operations, or inf and None when the band does not reach the bottom right corner or, with max_cost set,
+# once pastCutoff says the alignment will cost more than that. Given a list as rim, the cells just outside the band
+# are added to it as the rows are filled (see rowRim)
+def alignBand(rows, table, lo, hi, max_cost=None, rim=None):
+    num_rows = len(rows) + 1
+    num_cols = table.shape[1] + 1
+    if hi[-1] != num_cols - 1:
+        return float("inf"), None
+    row = INDEL * np.arange(hi[0] + 1, dtype=np.int32)
+    packed = [packDirections(np.full(hi[0] + 1, LEFT, dtype=np.uint8))]
+    if rim is not None:
+        rowRim(None, row, 0, lo, hi, rows, table, rim)
+    for i in range(1, num_rows):
+        prev = row
+        row, directions = fillBandRow(prev, lo[i - 1], lo[i], hi[i], table[rows[i - 1]], i)
+        packed.append(packDirections(directions))
+        if rim is not None:
+            rowRim(prev, row, i, lo, hi, rows, table, rim)
+        if max_cost is not None and i % CUTOFF_INTERVAL == 0 and \
+                pastCutoff(row, i, lo[i], num_rows - 1, num_cols - 1, max_cost):
+            return float("inf"), None
+    score = int(row[-1])
+    if score >= UNREACHABLE // 2 or (max_cost is not None and score > max_cost):
+        return float("inf"), None
+    return score, bandTraceback(packed, lo, num_rows, num_cols)
+
+
+# O(w) time and O(1) extra space. alignBand without the back pointers: only the current row is kept, and the cost
+# (or inf) is all that is returned. rim is as for alignBand
+def alignBandScore(rows, table, lo, hi, max_cost=None, rim=None):
+    num_rows = len(rows) + 1
+    num_cols = table.shape[1] + 1
+    if hi[-1] != num_cols - 1:
+        return float("inf")
+    row = INDEL * np.arange(hi[0] + 1, dtype=np.int32)
+    if rim is not None:
+        rowRim(None, row, 0, lo, hi, rows, table, rim)
+    for i in range(1, num_rows):
+        prev = row
+        row = fillBandScores(prev, lo[i - 1], lo[i], hi[i], table[rows[i - 1]], i)[0]
+        if rim is not None:
+            rowRim(prev, row, i, lo, hi, rows, table, rim)
+        if max_cost is not None and i % CUTOFF_INTERVAL == 0 and \
+                pastCutoff(row, i, lo[i], num_rows - 1, num_cols - 1, max_cost):
+            return float("inf")
+    score = int(row[-1])
+    if score >= UNREACHABLE // 2 or (max_cost is not None and score > max_cost):
+        return float("inf")
+    return score
+
+
+# O(mn) time and O(n) space. The cost alone of alignBlock over a whole matrix, keeping only the current row, with the
+# same max_cost cutoff as alignBand
+def alignScore(rows, table, max_cost=None):
+    num_rows = len(rows) + 1
+    num_cols = table.shape[1] + 1
+    steps = INDEL * np.arange(num_cols, dtype=np.int32)
+    row = steps
+    for i in range(1, num_rows):
+        row = fillScores(row, table[rows[i - 1]], INDEL * i, steps)[0]
+        if max_cost is not None and i % CUTOFF_INTERVAL == 0 and \
+                pastCutoff(row, i, 0, num_rows - 1, num_cols - 1, max_cost):
+            return float("inf")
+    score = int(row[-1])
+    if max_cost is not None and score > max_cost:
+        return float("inf")
+    return score
+
+
+# O(w). Whether every cell of row i (covering columns lo..lo + len(row) - 1 of the matrix for an m and an n character
+# sequence) is sure to end up above max_cost. Scores can still go down, since MATCH is negative, so each cell is
+# judged by its score plus the least the rest of the way can cost: a cell with a rows and b columns to go needs
+# |a - b| indels and at most min(a, b) other steps, each costing at least MATCH
+def pastCutoff(row, i, lo, m, n, max_cost):
+    rows_left = m - i
+    cols_left = n - lo - np.arange(len(row))
+    remaining = INDEL * np.abs(cols_left - rows_left) + min(MATCH, SUB) * np.minimum(cols_left, rows_left)
+    return int(np.min(row + remaining)) > max_cost
+
+
+# O(n) time. traceback for the packed rows of alignBand, where row i starts at column lo[i]
+def bandTraceback(packed, lo, num_rows, num_cols):
+    operations = []
+    i = num_rows - 1
+    j = num_cols - 1
+    while i > 0 or j > 0:
+        if i == 0:
+            direction = LEFT
+        elif j == 0:
+            direction = UP
+        else:
+            direction = directionAt(packed[i], j - int(lo[i]))
+        if direction == LEFT:
+            operations.append('l')
+            j -= 1
+        elif direction == UP:
+            operations.append('u')
+            i -= 1
+        else:
+            operations.append('d')
+            i -= 1
+            j -= 1
+    operations.reverse()
+    return operations
+
+
+# O(nk) time and O(n) space. A hash of every k character window of codes, built one character at a time over all
+# windows at once
+def kmerHashes(codes, k):
+    count = len(codes) - k + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.zeros(count, dtype=np.uint64)
+    values = codes.astype(np.uint64)
+    for t in range(k):
+        hashes *= np.uint64(KMER_BASE)
+        hashes += values[t:t + count]
+    return hashes
+
+
+# O((m + n) k + m log m) time. Seeds shared by the two sequences: the k-mers that occur exactly once in codes1 (so a
+# repeat cannot pull the corridor off course), looked up at every stride-th position of codes2 in a sorted index.
+# Returns the seeds' start positions in codes1 and codes2
+def seedMatches(codes1, codes2, k, stride):
+    hashes1 = kmerHashes(codes1, k)
+    values, first, counts = np.unique(hashes1, return_index=True, return_counts=True)
+    values = values[counts == 1]
+    first = first[counts == 1]
+    positions = np.arange(0, len(codes2) - k + 1, stride)
+    if len(values) == 0 or len(positions) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    wanted = kmerHashes(codes2, k)[positions]
+    found = np.minimum(np.searchsorted(values, wanted), len(values) - 1)
+    hit = values[found] == wanted
+    return first[found[hit]], positions[hit]
+
+
+# O(s log s) for s seeds. The longest chain of seeds that go strictly down and to the right together (a longest
+# increasing subsequence), which is the order the seeds of one alignment must keep. Returns their start positions
+def chainSeeds(starts1, starts2):
+    # Sorted by starts1, and by starts2 backwards within equal starts1, so no two seeds in one row are chained
+    order = np.lexsort((-starts2, starts1))
+    tails = []
+    tail_seeds = []
+    previous = np.full(len(order), -1, dtype=np.int64)
+    for seed in order:
+        j = int(starts2[seed])
+        length = bisect.bisect_left(tails, j)
+        if length > 0:
+            previous[seed] = tail_seeds[length - 1]
+        if length == len(tails):
+            tails.append(j)
+            tail_seeds.append(seed)
+        else:
+            tails[length] = j
+            tail_seeds[length] = seed
+    chain = []
+    seed = tail_seeds[-1] if tail_seeds else -1
+    while seed != -1:
+        chain.append(seed)
+        seed = previous[seed]
+    chain.reverse()
+    return starts1[chain], starts2[chain]
+
+
+# O(m) time and space. lo and hi for a corridor following the chained seeds from the top left corner to the bottom
+# right one. Between two seeds the alignment may be on either one's diagonal (an indel can be anywhere in between),
+# so each row there reaches from width columns left of the lower diagonal to width columns right of the higher one.
+# The limits are then evened out so neither ever decreases, which rowRim relies on
+def corridorLimits(num_rows, num_cols, anchors1, anchors2, width):
+    m = num_rows - 1
+    n = num_cols - 1
+    inside = (anchors1 > 0) & (anchors1 < m) & (anchors2 > 0) & (anchors2 < n)
+    anchors1 = np.concatenate(([0], anchors1[inside], [m]))
+    diagonals = np.concatenate(([0], anchors2[inside], [n])) - anchors1
+    i = np.arange(num_rows)
+    segment = np.minimum(np.searchsorted(anchors1, i, side='right') - 1, len(anchors1) - 2)
+    low = np.minimum(diagonals[segment], diagonals[segment + 1])
+    high = np.maximum(diagonals[segment], diagonals[segment + 1])
+    lo = np.minimum.accumulate(np.maximum(i + low - width, 0)[::-1])[::-1]
+    hi = np.maximum.accumulate(np.minimum(i + high + width, n))
+    return lo, hi
+
+
+# O(c) time for the c cells it adds. Adds to cells the (row, column, cost) of each cell of row i just outside a band
+# that a path can step into from inside it, with the least cost of getting there that way. Those are the cells left of
+# the row that are under the row above, and the one right after the row. prev and row are the scores of rows i - 1
+# and i (prev is None for row 0), and since lo and hi never decrease there are no others
+def rowRim(prev, row, i, lo, hi, rows, table, cells):
+    n = table.shape[1]
+
+    def score(scores, r, j):
+        if lo[r] <= j <= hi[r]:
+            return int(scores[j - lo[r]])
+        return UNREACHABLE
+
+    columns = list(range(int(lo[i - 1]), int(lo[i]))) if i > 0 else []
+    if hi[i] < n:
+        columns.append(int(hi[i]) + 1)
+    for j in columns:
+        best = UNREACHABLE
+        if j > 0:
+            best = min(best, score(row, i, j - 1) + INDEL)
+        if i > 0:
+            best = min(best, score(prev, i - 1, j) + INDEL)
+        if i > 0 and j > 0:
+            best = min(best, score(prev, i - 1, j - 1) + int(table[rows[i - 1], j - 1]))
+        if best < UNREACHABLE // 2:
+            cells.append((i, j, best))
+
+
+# O(c log c) time for c cells in the rims. A lower bound on the cost of any alignment of an m and an n character
+# sequence that leaves a corridor, given the corridor's rim (see rowRim) from filling it from the top left (forward)
+# and from filling it from the bottom right on the reversed sequences (backward). Such a path first steps out into
+# some cell x, and up to there it stays inside, so that part costs at least x's cost in the forward rim. Likewise it
+# last steps back in from some cell y, and from there on costs at least y's cost in the backward rim, and in between
+# it costs at least leastCost from x to y. The bound is the least of those sums over every x and y. With backward
+# None it is the least forward cost plus leastCost from x to the end instead, which needs no backward fill
+def corridorLowerBound(forward, backward, m, n):
+    # A path that leaves has to both step out and step back in, since both corners are inside
+    if not forward or (backward is not None and not backward):
+        return float("inf")
+    xi, xj, x_costs = np.array(forward, dtype=np.float64).T
+    if backward is None:
+        return np.min(x_costs + leastCost(m - xi, n - xj))
+    # The backward rim is indexed from the bottom right
+    yi, yj, y_costs = np.array(backward, dtype=np.float64).T
+    yi = m - yi
+    yj = n - yj
+    # leastCost(a, b) is half * (a + b) plus slope * |b - a|, so the sum for x and y splits into a part for x, a part
+    # for y and slope times how far apart their diagonals are. For each y the best x on either side of its diagonal
+    # comes from a running minimum over the x sorted by diagonal. Pairs with y before x are let in too, which can
+    # only make the bound lower
+    half = min(MATCH, SUB) / 2
+    slope = INDEL - half
+    x_diagonals = xj - xi
+    order = np.argsort(x_diagonals, kind='stable')
+    x_diagonals = x_diagonals[order]
+    x_parts = (x_costs - half * (xi + xj))[order]
+    below = np.minimum.accumulate(x_parts - slope * x_diagonals)
+    above = np.minimum.accumulate((x_parts + slope * x_diagonals)[::-1])[::-1]
+    y_diagonals = yj - yi
+    y_parts = y_costs + half * (yi + yj)
+    best = np.full(len(y_parts), np.inf)
+    count = np.searchsorted(x_diagonals, y_diagonals, side='right')
+    has_below = count > 0
+    best[has_below] = below[count[has_below] - 1] + slope * y_diagonals[has_below]
+    first = np.searchsorted(x_diagonals, y_diagonals, side='left')
+    has_above = first < len(x_parts)
+    best[has_above] = np.minimum(best[has_above], above[first[has_above]] - slope * y_diagonals[has_above])
+    return np.min(best + y_parts)
+
+
+# The least any alignment of an a and a b character sequence can cost (arrays work too): |a - b| indels and
+# min(MATCH, SUB) for each of the other min(a, b) pairs
+def leastCost(a, b):
+    return INDEL * np.abs(a - b) + min(MATCH, SUB) * np.minimum(a, b)
+
+
+# Aligns codes1 and codes2 inside a corridor around their chained shared k-mers (seedMatches, chainSeeds,
+# corridorLimits), filling it once. With prove set it also works out whether the cost is certainly the optimal one,
+# which is when it is no more than corridorLowerBound. That takes a second fill of the corridor backwards when the
+# forward rim's bound alone is not enough. When it is not shown optimal a wider corridor is not tried, since every
+# fill costs something per row however narrow it is, and the caller can go straight to the whole matrix instead.
+# O((m + n) w) time and space for width w, plus the rows between two seeds times the change in diagonal between them
+# (the size of any indel there). Returns the cost, the operations and whether the cost was shown to be optimal
+# (always False without prove). An optimal cost does not mean the same operations the full matrix would give, since
+# a tie can go outside the corridor
+def seedCorridor(codes1, codes2, k=SEED_LENGTH, width=CORRIDOR_WIDTH, prove=True):
+    m = len(codes1)
+    n = len(codes2)
+    starts1, starts2 = seedMatches(codes1, codes2, k, SEED_STRIDE)
+    anchors1, anchors2 = chainSeeds(starts1, starts2)
+    rows, table = substitutionTable(codes1, codes2)
+    lo, hi = corridorLimits(m + 1, n + 1, anchors1, anchors2, width)
+    if not prove:
+        score, operations = alignBand(rows, table, lo, hi)
+        return score, operations, False
+    forward = []
+    score, operations = alignBand(rows, table, lo, hi, rim=forward)
+    # The backward fill is only needed when the bound from the forward rim alone is not enough
+    if score <= corridorLowerBound(forward, None, m, n):
+        return score, operations, True
+    backward = []
+    reversed_rows, reversed_table = substitutionTable(codes1[::-1], codes2[::-1])
+    alignBandScore(reversed_rows, reversed_table, n - hi[::-1], n - lo[::-1], rim=backward)
+    return score, operations, score <= corridorLowerBound(forward, backward, m, n)
 
 
 class GeneSequencing:
@@ -139,155 +760,414 @@ class GeneSequencing:
 
     # This is the method called by the GUI.  _seq1_ and _seq2_ are two sequences to be aligned, _banded_ is a boolean
     # that tells you whether you should compute a banded alignment or full alignment, and _align_length_ tells you
-    # how many base pairs to use in computing the alignment
+    # how many base pairs to use in computing the alignment. With _linear_space_ set, the unbanded alignment is found
+    # with hirschbergOperations in O(m + n) space. _band_width_ is how far from the main diagonal the banded alignment
+    # may go, and with _adaptive_ set the band is widened until its answer is provably the optimal one. With
+    # _score_only_ set only align_cost is computed (the two strings come back as None), keeping a single row of
+    # scores and no back pointers. With _max_cost_ set, any alignment costing more than it is reported as inf, and
+    # the fill stops within CUTOFF_INTERVAL rows of that being certain. With _cigar_ set the result also has the
+    # whole alignment under 'cigar', as the runs cigarOperations returns (None when there is no alignment), which
+    # renderAlignment turns into the full gapped strings. With _seeded_ set, the unbanded alignment is only filled in
+    # a corridor around the k-mers the sequences share (seedCorridor), and with _fallback_ set the whole matrix is
+    # filled after all when the corridor's cost cannot be shown to be optimal
 
-    def align(self, seq1, seq2, banded, align_length):
+    def align(self, seq1, seq2, banded, align_length, linear_space=False, band_width=MAXINDELS, adaptive=False,
+              score_only=False, max_cost=None, cigar=False, seeded=False, fallback=True):
         self.banded = banded
         self.MaxCharactersToAlign = align_length
+        self.operations = None
+        codes1 = encodeSequence(seq1[:align_length])
+        codes2 = encodeSequence(seq2[:align_length])
         # calls banded matrix, O(kn) time and space. As explained above banded helper functions
         if banded:
             seq1 = seq1[:align_length]
             seq2 = seq2[:align_length]
-            score, seq1, seq2 = self.isBanded(seq1, seq2)
-        # calls not banded matrix, O(mn) time and space. As explained above not banded helper functions
+            score, seq1, seq2 = self.isBanded(seq1, seq2, band_width, adaptive, score_only, max_cost)
+        # calls not banded matrix, O(mn) time. As explained above not banded helper functions
         else:
-            score, seq1, seq2 = self.notBanded(seq1, seq2)
+            score, seq1, seq2 = self.notBanded(seq1, seq2, linear_space, score_only, max_cost, seeded, fallback)
+
+        if score_only:
+            return {'align_cost': score, 'seqi_first100': None, 'seqj_first100': None}
 
         alignment1 = seq1[:100]
         alignment2 = seq2[:100]
 
-        return {'align_cost': score, 'seqi_first100': alignment1, 'seqj_first100': alignment2}
+        result = {'align_cost': score, 'seqi_first100': alignment1, 'seqj_first100': alignment2}
+        if cigar:
+            result['cigar'] = cigarOperations(codes1, codes2, self.operations) if self.operations is not None else None
+        return result
 
-    # Sets up M by N matrix filled with inf costs.
-    def notBanded(self, seq1, seq2):
+    # O(mn) time, O(m + n) space for the scores and O(mn / 4) bytes for the back pointers (O(m + n) in linear space
+    # and score only modes). Scores are kept as int32 rows, each row is filled at once by fillRow, and each cell's
+    # back pointer is packed into 2 bits of a uint8 matrix, so no Python object is made per cell. In seeded mode it
+    # is O((m + n) w) for a corridor of width w when the corridor is enough, as explained above seedCorridor
+    def notBanded(self, seq1, seq2, linear_space=False, score_only=False, max_cost=None, seeded=False, fallback=True):
         num_rows = min(self.MaxCharactersToAlign, len(seq1)) + 1
         num_cols = min(self.MaxCharactersToAlign, len(seq2)) + 1
-        dp_matrix = np.full([num_rows, num_cols], fill_value=float("inf"), dtype=Node)
-        node = makeNode(0, 0)
-        node.score = 0
-        dp_matrix[0][0] = node
-        # Set up base cases (first col and row)
-        for i in range(1, num_rows):
-            node = makeNode(i, 0)
-            node.back = dp_matrix[i - 1, 0]
-            node.score = INDEL * i
-            dp_matrix[i][0] = node
-
-        for j in range(1, num_cols):
-            node = makeNode(0, j)
-            node.back = dp_matrix[0][j - 1]
-            node.score = INDEL * j
-            dp_matrix[0][j] = node
-        # fills in the rest of the matrix, does not revisit first row or col.
-        for i in range(1, num_rows):
-            for j in range(1, num_cols):
-                node = makeNode(i, j)
-                node.back, node.isMatch, toAdd = findBackPointer(dp_matrix[i][j - 1], dp_matrix[i - 1][j],
-                                                                 dp_matrix[i - 1][j - 1], seq1[i - 1], seq2[j - 1])
-                toAdd = toAdd + node.back.score
-                node.score = toAdd
-                dp_matrix[i][j] = node
+        codes1 = encodeSequence(seq1[:num_rows - 1])
+        codes2 = encodeSequence(seq2[:num_cols - 1])
+        if seeded and not score_only and num_rows > 1 and num_cols > 1:
+            score, operations, optimal = seedCorridor(codes1, codes2, prove=fallback)
+            if optimal or not fallback:
+                if max_cost is not None and score > max_cost:
+                    return float("inf"), "No Alignment Possible", "No Alignment Possible"
+                self.operations = operations
+                seq1, seq2 = writeString(seq1, seq2, operations)
+                return score, seq1[0:100], seq2[0:100]
+        rows, table = substitutionTable(codes1, codes2)
+        if score_only:
+            return alignScore(rows, table, max_cost), None, None
+        # Base cases (first row and col)
+        top = INDEL * np.arange(num_cols, dtype=np.int32)
+        left = INDEL * np.arange(num_rows, dtype=np.int32)
+        if linear_space:
+            # Hirschberg cannot stop part way, so pairs over max_cost are ruled out by a score only pass first
+            if max_cost is not None and alignScore(rows, table, max_cost) == float("inf"):
+                return float("inf"), "No Alignment Possible", "No Alignment Possible"
+            operations = hirschbergOperations(rows, table, top, left)
+            score = operationsCost(codes1, codes2, operations)
+        else:
+            score, operations = alignBlock(rows, table, top, left, max_cost)
+            if operations is None:
+                return float("inf"), "No Alignment Possible", "No Alignment Possible"
+        self.operations = operations
         # Calls O(n) writeString func. (top of file)
-        seq1, seq2 = writeString(seq1, seq2, dp_matrix, num_rows, num_cols)
-        return dp_matrix[num_rows - 1][num_cols - 1].score, seq1[0:100], seq2[0:100]
+        seq1, seq2 = writeString(seq1, seq2, operations)
+        return score, seq1[0:100], seq2[0:100]
 
-    # Sets up N by K matrix where K = 7 filled with inf.
-    def isBanded(self, seq1, seq2):
-        # If the string lengths are too far apart banded will not work, returns as such
-        if len(seq2) - len(seq1) > MAXINDELS:
+    # O(kn) time and space for a band of k cells on either side of the main diagonal (O(k) space in score only mode).
+    # With adaptive set, the band starts at band_width (or the length difference, if larger) and doubles until the
+    # best alignment inside it costs no more than bandLowerBound, the least any alignment leaving the band can cost
+    # (Ukkonen), so the answer is exact. That is O(kn) for the final k, since the earlier bands add up to less than
+    # the last one. With max_cost set the doubling also stops once bandLowerBound is over max_cost.
+    def isBanded(self, seq1, seq2, band_width=MAXINDELS, adaptive=False, score_only=False, max_cost=None):
+        m = len(seq1)
+        n = len(seq2)
+        # If the string lengths are too far apart the band never reaches the last cell, returns as such
+        if not adaptive and abs(n - m) > band_width:
+            if score_only:
+                return float("inf"), None, None
             return float("inf"), "No Alignment Possible", "No Alignment Possible"
-        num_rows = min(self.MaxCharactersToAlign, len(seq1)) + 1
-        num_cols = 7
-        dp_matrix = np.full([num_rows, num_cols], float("inf"))
-        prev_matrix = np.full([num_rows, num_cols], "None")
-
-        dp_matrix[0][0] = 0
-        # Set up base cases according to spec.
-        for i in range(1, MAXINDELS + 1):
-            prev_matrix[i][0] = "up"
-            dp_matrix[i][0] = i * INDEL
-
-        for j in range(1, MAXINDELS + 1):
-            prev_matrix[0][j] = "left"
-            dp_matrix[0][j] = j * INDEL
-        # Fills the N * K matrix with appropriate costs, does not revisit base case nodes
-        for i in range(1, num_rows):
-            for j in range(num_cols):
-                # Fills within basecase rows where i <= 3
-                if i <= MAXINDELS:
-                    if j == 0 or j > i + MAXINDELS:
-                        continue
-                    else:
-                        dp_matrix[i][j] = self.basecaseMax(i, j, dp_matrix, prev_matrix, seq1, seq2)
-                # Adapts to banded size matrix with appropriate shift for back pointers.
-                else:
-                    if (i - MAXINDELS) + j > len(seq2):
-                        continue
-                    else:
-                        dp_matrix[i][j] = self.bandedMax(i, j, dp_matrix, prev_matrix, seq1, seq2)
-
-        score = dp_matrix[num_rows - 1][MAXINDELS + len(seq2) - len(seq1)]
-        # Calls banded write string with O(n) complexity
-        seq1, seq2 = bandedWriteString(seq1, seq2, dp_matrix, prev_matrix, num_rows, num_cols)
+        rows, table = substitutionTable(encodeSequence(seq1), encodeSequence(seq2))
+        k = max(band_width, abs(n - m)) if adaptive else band_width
+        while True:
+            lo, hi = bandLimits(m + 1, n + 1, k)
+            if score_only:
+                score = alignBandScore(rows, table, lo, hi, max_cost)
+            else:
+                score, operations = alignBand(rows, table, lo, hi, max_cost)
+            if not adaptive or k >= max(m, n):
+                break
+            bound = bandLowerBound(m, n, k)
+            if score <= bound or (max_cost is not None and bound > max_cost):
+                break
+            k *= 2
+        if score_only:
+            return score, None, None
+        if operations is None:
+            return float("inf"), "No Alignment Possible", "No Alignment Possible"
+        self.operations = operations
+        # Calls O(n) writeString func. (top of file)
+        seq1, seq2 = writeString(seq1, seq2, operations)
         return score, seq1, seq2
 
-    # O(1) time and space complexity. Just compares two to three back pointers, depending on location of back pointers
-    def bandedMax(self, i, j, dp_matrix, prev_matrix, seq1, seq2):
-        offset = i - MAXINDELS
-        minScore = float("inf")
-        toAdd = 5
-        if j > 0:
-            minScore = dp_matrix[i][j - 1]
-            direction = "left"
-        if j < i + MAXINDELS - offset:
-            if dp_matrix[i - 1][j + 1] + 5 < minScore + 5:
-                minScore = dp_matrix[i - 1][j + 1]
-                direction = "up"
-        if seq1[i - 1] == seq2[(i - MAXINDELS) + j - 1]:
-            diagVal = -3
+
+# Aligns every pair i <= j of seqs and yields (i, j, result) as each pair finishes, in no particular order, where
+# result is the dict align returns. Alignment costs are symmetric, so (j, i) is not computed separately. Pairs whose
+# key (see alignmentKey) is already in the cache at cache_path are yielded first without any work, pairs with the
+# same key are only aligned once, and the rest go to a pool of worker processes with at most 2 pairs per worker in
+# flight, each finished result being stored in the cache. cache_path=None turns the cache off, and with workers set
+# to 0 or 1 everything runs in this process
+def align_all_pairs(seqs, banded, align_length, workers=None, cache_path=ALIGN_CACHE_PATH):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    cache = AlignmentCache(cache_path) if cache_path is not None else None
+    try:
+        # key -> the pairs waiting on it, for the keys that still have to be aligned
+        jobs = {}
+        for i in range(len(seqs)):
+            for j in range(i, len(seqs)):
+                key = alignmentKey(seqs[i], seqs[j], banded, align_length)
+                if key in jobs:
+                    jobs[key].append((i, j))
+                    continue
+                result = cache.get(key) if cache is not None else None
+                if result is not None:
+                    yield i, j, result
+                else:
+                    jobs[key] = [(i, j)]
+
+        if workers <= 1:
+            for key, pairs in jobs.items():
+                i, j = pairs[0]
+                result = alignPair(seqs[i], seqs[j], banded, align_length)
+                yield from finishPairs(cache, key, pairs, result)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+            # Only the part of each sequence that can matter is sent, so a memory mapped one is not copied whole
+            keep = max(align_length, WRITE_PREFIX)
+            for key, pairs in jobs.items():
+                i, j = pairs[0]
+                pending[pool.submit(alignPair, seqs[i][:keep], seqs[j][:keep], banded, align_length)] = key
+                while len(pending) >= 2 * workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key = pending.pop(future)
+                        yield from finishPairs(cache, key, jobs[key], future.result())
+            for future in list(pending):
+                key = pending.pop(future)
+                yield from finishPairs(cache, key, jobs[key], future.result())
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+# Aligns one pair. This is what the worker processes run
+def alignPair(seq1, seq2, banded, align_length):
+    return GeneSequencing().align(seq1, seq2, banded, align_length)
+
+
+# Stores a finished result in the cache and yields it for every pair that was waiting on it
+def finishPairs(cache, key, pairs, result):
+    if cache is not None:
+        cache.put(key, result)
+    for i, j in pairs:
+        yield i, j, result
+
+
+# O(n). The cache key of an alignment: a SHA-256 of the code version, the settings and the two sequences. Only the
+# first align_length characters are aligned and writeString only looks at the first WRITE_PREFIX, so anything past
+# both is left out of the hash and pairs that differ only there share a key. Hashing only the first 100 is not
+# enough, gaps shift characters from past 100 into the strings writeString returns
+def alignmentKey(seq1, seq2, banded, align_length):
+    bases1 = sequenceBytes(seq1[:max(align_length, WRITE_PREFIX)])
+    bases2 = sequenceBytes(seq2[:max(align_length, WRITE_PREFIX)])
+    digest = hashlib.sha256()
+    digest.update('{}|{}|{}|{}|{}|'.format(ALIGN_CACHE_VERSION, int(banded), align_length,
+                                            len(bases1), len(bases2)).encode())
+    digest.update(bases1)
+    digest.update(bases2)
+    return digest.hexdigest()
+
+
+# The bytes of a sequence given as a string or as a byte code array from readFasta
+def sequenceBytes(seq):
+    if isinstance(seq, np.ndarray):
+        return seq.tobytes()
+    return seq.encode()
+
+
+# Results of align stored by alignmentKey in an SQLite file, as JSON (which keeps an inf align_cost as Infinity).
+# Every put is committed, so results survive a run that is stopped part way
+class AlignmentCache:
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS alignments (key TEXT PRIMARY KEY, result TEXT NOT NULL)')
+        self.connection.commit()
+
+    def get(self, key):
+        row = self.connection.execute('SELECT result FROM alignments WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key, result):
+        self.connection.execute('INSERT OR REPLACE INTO alignments (key, result) VALUES (?, ?)',
+                                (key, json.dumps(result)))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+# How many AlignmentSession objects AlignmentSessions keeps before dropping the least recently used one
+SESSION_CACHE_SIZE = 32
+
+
+# The matrix of one (seq1, seq2, banded) pair, kept between calls so that asking again with a larger align_length
+# only fills the cells the longer prefixes add. Every cell's score and back pointer depend only on the prefixes that
+# end at it, so the cells already filled stay correct. A smaller align_length needs no filling at all, only a
+# traceback from a cell that is already there
+class AlignmentSession:
+
+    def __init__(self, seq1, seq2, banded, band_width=MAXINDELS):
+        self.seq1 = seq1
+        self.seq2 = seq2
+        self.banded = banded
+        self.band_width = band_width
+        self.codes1 = encodeSequence(seq1)
+        self.codes2 = encodeSequence(seq2)
+        # The filled part of the matrix covers seq1[:num_rows - 1] against seq2[:num_cols - 1]
+        self.num_rows = 1
+        self.num_cols = 1
+        # Unbanded: blocks of back pointers (see extendBlocks) and the scores of the last row and column
+        self.blocks = []
+        self.last_row = np.zeros(1, dtype=np.int32)
+        self.last_col = np.zeros(1, dtype=np.int32)
+        # Banded: the packed back pointers, lo and hi of every row, and the scores of the last few rows by row number
+        self.packed = [packDirections(np.full(1, LEFT, dtype=np.uint8))]
+        self.lo = [0]
+        self.hi = [0]
+        self.scores = {0: np.zeros(1, dtype=np.int32)}
+
+    # Returns what GeneSequencing().align(seq1, seq2, banded, align_length, band_width=band_width) does. O(c) time
+    # for the c cells not filled by an earlier call, plus O(n) for the traceback
+    def align(self, align_length):
+        m = min(align_length, len(self.seq1))
+        n = min(align_length, len(self.seq2))
+        if self.banded:
+            if abs(n - m) > self.band_width:
+                return {'align_cost': float("inf"), 'seqi_first100': "No Alignment Possible",
+                        'seqj_first100': "No Alignment Possible"}
+            self.extendBand(m + 1, n + 1)
+            operations = bandTraceback(self.packed, self.lo, m + 1, n + 1)
+            seq1, seq2 = writeString(self.seq1[:align_length], self.seq2[:align_length], operations)
         else:
-            diagVal = 1
-        if dp_matrix[i - 1][j] + diagVal < minScore + 5:
-            minScore = dp_matrix[i - 1][j]
-            direction = "diag"
-            toAdd = diagVal
-        prev_matrix[i][j] = direction
-        score = minScore + toAdd
-        return score
-
-    # O(1) time and space complexity. Comparing three back values.
-    def basecaseMax(self, i, j, dp_matrix, prev_matrix, seq1, seq2):
-        minScore = dp_matrix[i][j - 1]
-        direction = "left"
-        toAdd = 5
-        if dp_matrix[i - 1][j] + 5 < minScore + 5:
-            minScore = dp_matrix[i - 1][j]
-            direction = "up"
-        if seq1[i - 1] == seq2[j - 1]:
-            diagVal = -3
+            self.extendBlocks(m + 1, n + 1)
+            operations = self.blockTraceback(m, n)
+            seq1, seq2 = writeString(self.seq1, self.seq2, operations)
+        score = operationsCost(self.codes1, self.codes2, operations)
+        return {'align_cost': score, 'seqi_first100': seq1[:100], 'seqj_first100': seq2[:100]}
+
+    # Grows the unbanded matrix to at least num_rows by num_cols. The cells are kept as blocks (r, c, h, w, packed)
+    # holding the back pointers of rows r + 1..r + h and columns c + 1..c + w, so growing adds at most two: the new
+    # columns of the old rows, which start from the saved last column, and then the new rows, which start from the
+    # saved last row
+    def extendBlocks(self, num_rows, num_cols):
+        old_rows = self.num_rows
+        old_cols = self.num_cols
+        num_rows = max(num_rows, old_rows)
+        num_cols = max(num_cols, old_cols)
+        if num_cols > old_cols and old_rows > 1:
+            rows, table = substitutionTable(self.codes1[:old_rows - 1], self.codes2[old_cols - 1:num_cols - 1])
+            top = INDEL * np.arange(old_cols - 1, num_cols, dtype=np.int32)
+            packed, bottom, self.last_col = fillBlock(rows, table, top, self.last_col)
+            self.blocks.append((0, old_cols - 1, old_rows - 1, num_cols - old_cols, packed))
+            self.last_row = np.concatenate((self.last_row, bottom[1:]))
+        elif num_cols > old_cols:
+            self.last_row = INDEL * np.arange(num_cols, dtype=np.int32)
+            self.last_col = self.last_row[-1:].copy()
+        if num_rows > old_rows:
+            rows, table = substitutionTable(self.codes1[old_rows - 1:num_rows - 1], self.codes2[:num_cols - 1])
+            left = INDEL * np.arange(old_rows - 1, num_rows, dtype=np.int32)
+            packed, self.last_row, right = fillBlock(rows, table, self.last_row, left)
+            self.blocks.append((old_rows - 1, 0, num_rows - old_rows, num_cols - 1, packed))
+            self.last_col = np.concatenate((self.last_col, right[1:]))
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+
+    # O(n) time plus a scan of the blocks each time the path crosses into another one. traceback for the cells of
+    # extendBlocks, starting from row m, column n
+    def blockTraceback(self, m, n):
+        operations = []
+        i = m
+        j = n
+        block = None
+        while i > 0 or j > 0:
+            if i == 0:
+                direction = LEFT
+            elif j == 0:
+                direction = UP
+            else:
+                # The path only moves up and left, so it is still in the same block while it is below and right
+                # of the block's top left corner
+                if block is None or i <= block[0] or j <= block[1]:
+                    block = next(b for b in self.blocks if b[0] < i <= b[0] + b[2] and b[1] < j <= b[1] + b[3])
+                direction = directionAt(block[4][i - block[0]], j - block[1])
+            if direction == LEFT:
+                operations.append('l')
+                j -= 1
+            elif direction == UP:
+                operations.append('u')
+                i -= 1
+            else:
+                operations.append('d')
+                i -= 1
+                j -= 1
+        operations.reverse()
+        return operations
+
+    # Grows the banded matrix to at least num_rows by num_cols. Rows near the bottom were cut off at the old last
+    # column, so the rows from the first one the new columns reach are filled again along with the new rows. That is
+    # at most 2k + 1 old rows for a band of k, whose scores are the only ones kept
+    def extendBand(self, num_rows, num_cols):
+        k = self.band_width
+        num_rows = max(num_rows, self.num_rows)
+        num_cols = max(num_cols, self.num_cols)
+        if num_rows == self.num_rows and num_cols == self.num_cols:
+            return
+        first = min(max(self.num_cols - k, 0), self.num_rows) if num_cols > self.num_cols else self.num_rows
+        lo, hi = bandLimits(num_rows, num_cols, k)
+        del self.packed[first:]
+        self.lo[first:] = lo[first:].tolist()
+        self.hi[first:] = hi[first:].tolist()
+        # Only the rows being filled need their substitution table rows
+        offset = max(first - 1, 0)
+        rows, table = substitutionTable(self.codes1[offset:num_rows - 1], self.codes2[:num_cols - 1])
+        for i in range(first, num_rows):
+            if i == 0:
+                row = INDEL * np.arange(hi[0] + 1, dtype=np.int32)
+                directions = np.full(hi[0] + 1, LEFT, dtype=np.uint8)
+            else:
+                row, directions = fillBandRow(self.scores[i - 1], lo[i - 1], lo[i], hi[i],
+                                              table[rows[i - 1 - offset]], i)
+            self.packed.append(packDirections(directions))
+            self.scores[i] = row
+        for i in [i for i in self.scores if i < num_rows - 2 * k - 2]:
+            del self.scores[i]
+        self.num_rows = num_rows
+        self.num_cols = num_cols
+
+
+# Keeps up to max_sessions AlignmentSession objects, one for each (seq1, seq2, banded) pair, and drops the least
+# recently used one when there are more. String sequences are keyed on their contents: a str caches its hash, and
+# equal strings are only compared in full when their hashes match, so an equal copy of a sequence (read again from
+# a file, say) finds the same session. Byte code arrays cannot be hashed, so they are keyed on the identity of the
+# array instead. Each session holds on to its sequences, so their ids cannot be reused while it is cached, but an
+# array must not be changed in place between calls, and an equal but different array starts a new session
+class AlignmentSessions:
+
+    def __init__(self, max_sessions=SESSION_CACHE_SIZE, band_width=MAXINDELS):
+        self.max_sessions = max_sessions
+        self.band_width = band_width
+        self.sessions = OrderedDict()
+
+    # Same arguments and result as GeneSequencing.align, reusing the pair's matrix from earlier calls
+    def align(self, seq1, seq2, banded, align_length):
+        key = (sessionKey(seq1), sessionKey(seq2), bool(banded))
+        session = self.sessions.get(key)
+        if session is None:
+            session = AlignmentSession(seq1, seq2, banded, self.band_width)
+            self.sessions[key] = session
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
         else:
-            diagVal = 1
-        if dp_matrix[i - 1][j - 1] + diagVal < minScore + 5:
-            minScore = dp_matrix[i - 1][j - 1]
-            direction = "diag"
-            toAdd = diagVal
-        prev_matrix[i][j] = direction
-        score = minScore + toAdd
-        return score
-
-
-# Used for unbanded. I switched for banded because it was getting too complex.
-class Node:
-    def __init__(self):
-        self.score = float("inf")
-        self.back = None
-        self.row = 0
-        self.col = 0
-        self.isMatch = False
-
-
-def makeNode(row, col):
-    node = Node()
-    node.row = row
-    node.col = col
-    return node
+            self.sessions.move_to_end(key)
+        return session.align(align_length)
+
+
+# A string is its own key, anything else (a byte code array) is keyed on its id
+def sessionKey(seq):
+    return seq if isinstance(seq, str) else ('id', id(seq))
+
+
+# O(mn) time and O(mn / 4) space. Fills a block of the matrix from the scores of its top row and left column like
+# alignBlock, and returns its packed back pointers with the scores of its bottom row and right column
+def fillBlock(rows, table, top, left):
+    num_rows = len(rows) + 1
+    num_cols = table.shape[1] + 1
+    steps = INDEL * np.arange(num_cols, dtype=np.int32)
+    packed = np.zeros([num_rows, -(-num_cols // 4)], dtype=np.uint8)
+    right = np.empty(num_rows, dtype=np.int32)
+    right[0] = top[-1]
+    row = top
+    for i in range(1, num_rows):
+        row, directions = fillRow(row, table[rows[i - 1]], left[i], steps)
+        packed[i] = packDirections(directions)
+        right[i] = row[-1]
+    return packed, row, right
@@ -2,241 +2,490 @@
 
 
 from CS312Graph import *
+import heapq
+import math
 import time
+import numpy as np
+
+
+# Operation counters for comparing the queues. Counting is off unless enable_stats has been called, and when it is on
+# the heaps add their swaps once per call instead of once per swap, so the hot loops are not slowed down
+class QueueStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.inserts = 0
+        self.delete_mins = 0
+        self.decrease_keys = 0
+        self.swaps = 0
+        self.stale_pops = 0
+
+    def as_dict(self):
+        return {'inserts': self.inserts, 'delete_mins': self.delete_mins, 'decrease_keys': self.decrease_keys,
+                'swaps': self.swaps, 'stale_pops': self.stale_pops}
+
+
+STATS = None
+
+
+# Starts counting into stats (a new QueueStats if none is given) and returns it
+def enable_stats(stats=None):
+    global STATS
+    STATS = stats if stats is not None else QueueStats()
+    return STATS
+
+
+def disable_stats():
+    global STATS
+    STATS = None
 
 
 class NetworkRoutingSolver:
     def __init__(self):
         pass
 
+    # O(V + ElogE). Compiles the graph once into compressed sparse row arrays: the edges out of node u are
+    # edges[offsets[u]:offsets[u + 1]], going to targets[offsets[u]:offsets[u + 1]] with those weights. The queries
+    # then run on plain arrays instead of walking node and edge objects. The reverse arrays hold the same edges
+    # grouped by the node they go into (rev_edges gives their index in edges), for searching back from a destination,
+    # and coords and heuristic_scale are what A* needs (see findShortestPath). The searches themselves read Python
+    # list copies of the arrays (the *_list attributes): nodes have only a few edges each, and a plain loop over a few
+    # list items is much cheaper than the NumPy calls it would take to relax them as arrays
     def initializeNetwork(self, network):
         assert (type(network) == CS312Graph)
         self.network = network
+        nodes = network.nodes
+        self.edges = [edge for node in nodes for edge in node.neighbors]
+        self.offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum([len(node.neighbors) for node in nodes], out=self.offsets[1:])
+        self.targets = np.fromiter((edge.dest.node_id for edge in self.edges), dtype=np.int64, count=len(self.edges))
+        self.weights = np.fromiter((edge.length for edge in self.edges), dtype=np.float64, count=len(self.edges))
+        sources = np.repeat(np.arange(len(nodes), dtype=np.int64), np.diff(self.offsets))
+        self.rev_edges = np.argsort(self.targets, kind='stable')
+        self.rev_offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.targets, minlength=len(nodes)), out=self.rev_offsets[1:])
+        self.rev_targets = sources[self.rev_edges]
+        self.rev_weights = self.weights[self.rev_edges]
+        self.coords = np.array([(node.loc.x(), node.loc.y()) for node in nodes], dtype=np.float64).reshape(-1, 2)
+        # The largest factor that keeps scale * straight line distance at or under every edge length, so the A*
+        # heuristic never overestimates (and stays consistent) whatever units the lengths are in
+        euclid = np.hypot(*(self.coords[sources] - self.coords[self.targets]).T)
+        ratios = self.weights[euclid > 0] / euclid[euclid > 0]
+        self.heuristic_scale = float(ratios.min()) if len(ratios) else 0.0
+        self.offset_list = self.offsets.tolist()
+        self.target_list = self.targets.tolist()
+        self.weight_list = self.weights.tolist()
+        self.rev_offset_list = self.rev_offsets.tolist()
+        self.rev_target_list = self.rev_targets.tolist()
+        self.rev_weight_list = self.rev_weights.tolist()
+        self.rev_edge_list = self.rev_edges.tolist()
+        self.x_list = self.coords[:, 0].tolist()
+        self.y_list = self.coords[:, 1].tolist()
 
+    # O(P) for a path of P edges. Walks the predecessor edges back from the destination to the source
     def getShortestPath(self, destIndex):
         self.dest = destIndex
-        path_edges = []
-        total_length = 0
-        start_node = self.network.nodes[self.source]
-        shortest_paths = self.all_paths
-        notFound = True
-        current = None
-        for node in self.network.nodes:
-            if node.node_id == destIndex:
-                current = node
-                break
-        if current is None:
-            return {'cost': float('inf'), 'path': path_edges}
-        previous = None
-        while notFound:
-            for i in shortest_paths:
-                if current.node_id == i.id:
-                    total_length += i.dist
-                    for node in self.network.nodes:
-                        if node.node_id == i.prev:
-                            previous = node
-                    if previous is None:
-                        return {'cost': float('inf'), 'path': path_edges}
-                    newEdge = None
-                    for edge in previous.neighbors:
-                        if edge.src == previous and edge.dest == current:
-                            newEdge = edge
-                    path_edges.append((current.loc, previous.loc, '{:.0f}'.format(newEdge.length)))
-                    if previous == start_node:
-                        notFound = False
-                    else:
-                        current = previous
-        return {'cost': total_length, 'path': path_edges}
-
-    # Depending on the implementation we use this function is either O(V) for the array or O(logV) for the heap.
-    # Each method is implemented below and has more details for the time complexity.
-    # The space complexity is O(V) either way. We store each point and its distance to its connected nodes,
-    # along the way we add some variables, like previous, to guide us back to the start, but all space complexity is
-    # linear with the amount of points, or V, that we get past in.
-    def computeShortestPaths(self, srcIndex, use_heap=False):
+        if destIndex < 0 or destIndex >= len(self.dist) or self.dist[destIndex] == float('inf'):
+            return {'cost': float('inf'), 'path': []}
+        return {'cost': float(self.dist[destIndex]), 'path': self.pathEdges(self.treeEdges(self.pred_edge, destIndex))}
+
+    # O(P). The indices into edges of the tree edges from node back to the root of the search that filled pred_edge,
+    # in the order they are walked. reverse is for a search run on the reverse arrays, whose tree edges point away
+    # from the root
+    def treeEdges(self, pred_edge, node, reverse=False):
+        edge_indices = []
+        edge_index = pred_edge[node]
+        while edge_index >= 0:
+            edge_indices.append(int(edge_index))
+            edge = self.edges[edge_index]
+            edge_index = pred_edge[edge.dest.node_id if reverse else edge.src.node_id]
+        return edge_indices
+
+    # The (dest, src, label) tuples the GUI draws, for edge indices listed from the destination back
+    def pathEdges(self, edge_indices):
+        return [(self.edges[i].dest.loc, self.edges[i].src.loc, '{:.0f}'.format(self.edges[i].length))
+                for i in edge_indices]
+
+    # O(P) per destination. Every route comes out of the same shortest path tree, so computeShortestPaths only has
+    # to run once for the source
+    def getShortestPaths(self, destIndices):
+        return [self.getShortestPath(destIndex) for destIndex in destIndices]
+
+    # Depending on the queue this function is O(V^2) for the array, O((V + E)logV) for the heaps and O(E + D) for
+    # the bucket queue when every weight is an integer and D is the largest distance. queue is one of the names in
+    # QUEUES, use_heap=True picks the binary heap when no queue is named. Each queue is implemented below and has more
+    # details for the time complexity.
+    # The space complexity is O(V) either way. Distances and predecessors are kept in lists indexed by node id while
+    # the search runs and copied into the dist and pred_edge arrays at the end (pred_edge holds the index into edges
+    # of the edge each node was reached by, or -1 for none), which getShortestPath reads back.
+    def computeShortestPaths(self, srcIndex, use_heap=False, queue=None):
         self.source = srcIndex
         t1 = time.time()
-        if not use_heap:  # O(V) time complexity (see implementation below)
-            distances = []
-            unvisited = PriorityArray()
-            unvisited.nodes = []
-            for index, node in enumerate(self.network.nodes):
-                node = new_node(node.node_id, None, float('inf'))
-                unvisited.insert(node)
-                distances.append(node)
-            distances[srcIndex].dist = 0
-            unvisited.nodes[srcIndex].dist = 0
-            while len(unvisited.nodes) > 0:
-                current = unvisited.delete_min()
-                graphPoint = self.network.nodes[current.id]
-                for i in graphPoint.neighbors:
-                    dist = current.dist + i.length
-                    if dist < distances[i.dest.node_id].dist:
-                        distances[i.dest.node_id].dist = dist
-                        distances[i.dest.node_id].prev = i.src.node_id
-                        for j in range(len(unvisited.nodes) - 1):
-                            if unvisited.nodes[j].id == i.dest.node_id:
-                                unvisited.decreaseDist(j, dist)
-            self.all_paths = distances
-        else:  # Heap implementation: O(logV) time complexity (see implementation below)
-            distances = {}
-            dist_nodes = []
-            for index, node in enumerate(self.network.nodes):
-                distances[node.node_id] = float('inf')
-                node = new_node(node.node_id, None, float('inf'))
-                dist_nodes.append(node)
-            distances[srcIndex] = 0
-            dist_nodes[srcIndex].dist = 0
-            heap = PriorityHeap(distances)
-            while len(heap.heap) > 0:
-                min_node = heap.delete_min()
-                for edge in self.network.nodes[min_node].neighbors:
-                    if edge.length + distances[min_node] < distances[edge.dest.node_id]:
-                        distances[edge.dest.node_id] = distances[min_node] + edge.length
-                        dist_nodes[edge.dest.node_id].dist = distances[min_node] + edge.length
-                        dist_nodes[edge.dest.node_id].prev = min_node
-                        heap.decreaseKey(edge.dest.node_id, distances[edge.dest.node_id])
-            self.all_paths = dist_nodes
+        num_nodes = len(self.offset_list) - 1
+        dist = [math.inf] * num_nodes
+        pred_edge = [-1] * num_nodes
+        if queue is None:
+            queue = 'heap' if use_heap else 'array'
+        unvisited = QUEUES[queue](dist)
+        dist[srcIndex] = 0.0
+        unvisited.decreaseKey(srcIndex, 0.0)
+        while len(unvisited) > 0:
+            current = unvisited.delete_min()
+            if dist[current] == math.inf:
+                break
+            self.relaxEdges(current, dist, pred_edge, unvisited)
+        self.dist = np.array(dist, dtype=np.float64)
+        self.pred_edge = np.array(pred_edge, dtype=np.int64)
         t2 = time.time()
         return t2 - t1
 
+    # Settles nodes from srcIndex only until destIndex is settled, and returns its route in the same form as
+    # getShortestPath. mode is 'dijkstra', 'bidirectional' (see bidirectionalSearch) or 'astar', which keys the queue
+    # on distance plus heuristic_scale times the straight line distance to the destination, so the search heads
+    # toward it. The heuristic never overestimates, so A* settles the destination at its true distance. queue is one
+    # of the names in QUEUES, and the number of settled nodes shows up as delete_mins when stats are enabled
+    def findShortestPath(self, srcIndex, destIndex, mode='dijkstra', queue='heap'):
+        if mode == 'bidirectional':
+            return self.bidirectionalSearch(srcIndex, destIndex, queue)
+        if mode not in ('dijkstra', 'astar'):
+            raise ValueError('unknown search mode {!r}'.format(mode))
+        num_nodes = len(self.offset_list) - 1
+        dist = [math.inf] * num_nodes
+        pred_edge = [-1] * num_nodes
+        keys = [math.inf] * num_nodes if mode == 'astar' else None
+        unvisited = QUEUES[queue](dist if keys is None else keys)
+        dist[srcIndex] = 0.0
+        if keys is None:
+            unvisited.decreaseKey(srcIndex, 0.0)
+        else:
+            keys[srcIndex] = self.heuristic(srcIndex, destIndex)
+            unvisited.decreaseKey(srcIndex, keys[srcIndex])
+        while len(unvisited) > 0:
+            current = unvisited.delete_min()
+            if current == destIndex or dist[current] == math.inf:
+                break
+            self.relaxEdges(current, dist, pred_edge, unvisited, keys=keys, goal=destIndex)
+        return {'cost': dist[destIndex], 'path': self.pathEdges(self.treeEdges(pred_edge, destIndex))}
 
-# O(1)
-class Node:
-    def __init__(self):
-        self.id = 0
-        self.prev = -1
-        self.dist = float('inf')
+    # The A* heuristic: heuristic_scale times the straight line distance from node to goal. Constant Time
+    def heuristic(self, node, goal):
+        return self.heuristic_scale * math.hypot(self.x_list[node] - self.x_list[goal],
+                                                 self.y_list[node] - self.y_list[goal])
+
+    # Searches forward from srcIndex and backward from destIndex on the reverse arrays, one node per side in turn.
+    # best is the shortest route seen through any node reached from both sides, and the search stops once the two
+    # sides' last settled distances add up to at least best, since any shorter route would have to pass through a
+    # node closer than that to one of the ends
+    def bidirectionalSearch(self, srcIndex, destIndex, queue='heap'):
+        num_nodes = len(self.offset_list) - 1
+        dist = ([math.inf] * num_nodes, [math.inf] * num_nodes)
+        pred_edge = ([-1] * num_nodes, [-1] * num_nodes)
+        unvisited = (QUEUES[queue](dist[0]), QUEUES[queue](dist[1]))
+        dist[0][srcIndex] = 0.0
+        dist[1][destIndex] = 0.0
+        unvisited[0].decreaseKey(srcIndex, 0.0)
+        unvisited[1].decreaseKey(destIndex, 0.0)
+        offsets = (self.offset_list, self.rev_offset_list)
+        targets = (self.target_list, self.rev_target_list)
+        settled = [0.0, 0.0]
+        best = 0.0 if srcIndex == destIndex else math.inf
+        meet = srcIndex
+        side = 0
+        while len(unvisited[0]) > 0 and len(unvisited[1]) > 0:
+            current = unvisited[side].delete_min()
+            current_dist = dist[side][current]
+            if current_dist == math.inf or current_dist + settled[1 - side] >= best:
+                break
+            settled[side] = current_dist
+            self.relaxEdges(current, dist[side], pred_edge[side], unvisited[side], reverse=side == 1)
+            forward, backward = dist
+            for i in range(offsets[side][current], offsets[side][current + 1]):
+                v = targets[side][i]
+                total = forward[v] + backward[v]
+                if total < best:
+                    best = total
+                    meet = v
+            side = 1 - side
+        if best == math.inf:
+            return {'cost': best, 'path': []}
+        edge_indices = self.treeEdges(pred_edge[1], meet, reverse=True)[::-1] + self.treeEdges(pred_edge[0], meet)
+        return {'cost': best, 'path': self.pathEdges(edge_indices)}
 
+    # O(d) for the d edges out of node u (into u with reverse, using the reverse arrays), one scalar step per edge
+    # over the list copies of the arrays. A target can appear more than once, with parallel edges. For A* the queue
+    # is keyed on keys, and a lowered node's key is its distance plus its heuristic toward goal
+    def relaxEdges(self, u, dist, pred_edge, queue, reverse=False, keys=None, goal=None):
+        if reverse:
+            offsets, targets, weights = self.rev_offset_list, self.rev_target_list, self.rev_weight_list
+            edge_ids = self.rev_edge_list
+        else:
+            offsets, targets, weights = self.offset_list, self.target_list, self.weight_list
+            edge_ids = None
+        dist_u = dist[u]
+        for i in range(offsets[u], offsets[u + 1]):
+            v = targets[i]
+            d = dist_u + weights[i]
+            if d < dist[v]:
+                dist[v] = d
+                pred_edge[v] = i if edge_ids is None else edge_ids[i]
+                if keys is None:
+                    queue.decreaseKey(v, d)
+                else:
+                    keys[v] = d + self.heuristic(v, goal)
+                    queue.decreaseKey(v, keys[v])
 
-# O(1)
-def new_node(id, prev, dist):
-    node = Node()
-    node.id = id
-    node.prev = prev
-    node.dist = dist
-    return node
 
+# Every queue below holds node ids keyed by the distance list the search fills, one entry per node. It starts empty
+# (the array queue starts with every node at an infinite distance instead), delete_min removes and returns the
+# closest one, and decreaseKey(node_id, dist) lowers a node (adding it if it is not queued yet) after its entry in
+# the distance list has been lowered
 
 # Dijkstra's Array implementation O(V)
 class PriorityArray:
-    nodes = []
 
-    # O(1) time complexity since we only call .append
-    def insert(self, node):
-        print("In A Insert")
-        self.nodes.append(node)
+    # Keeps every node id queued with its own copy of the distances in an array, so finding the smallest is one
+    # array operation. Settled nodes go back to an infinite key and are left out by the mask
+    def __init__(self, dist):
+        self.keys = np.full(len(dist), np.inf)
+        self.queued = np.ones(len(dist), dtype=bool)
+        self.size = len(dist)
+        if STATS is not None:
+            STATS.inserts += len(dist)
 
-    # O(V) time complexity since we have to loop through all our nodes to find the smallest distance
+    def __len__(self):
+        return self.size
+
+    # O(V) time complexity since we have to look at every node still queued to find the smallest distance, but it is
+    # one array operation instead of a Python loop
     def delete_min(self):
-        print("In A Delete")
-        min = float('inf')
-        minNode = self.nodes[0]
-        for i in self.nodes:
-            if i.dist < min:
-                min = i.dist
-                minNode = i
-        self.nodes.remove(minNode)
-        return minNode
-
-    # O(1) time complexity since we only change a value that is sent to this function
-    def decreaseDist(self, index, newDist):
-        print("In A Decrease")
-        self.nodes[index].dist = newDist
-
-
-# Dijkstra's Heap implementation O(logV)
+        if STATS is not None:
+            STATS.delete_mins += 1
+        node_id = int(np.argmin(self.keys))
+        if not self.queued[node_id]:
+            node_id = int(np.flatnonzero(self.queued)[0])
+        self.queued[node_id] = False
+        self.keys[node_id] = np.inf
+        self.size -= 1
+        return node_id
+
+    # O(1) time complexity since we only store the new distance
+    def decreaseKey(self, node_id, dist):
+        if STATS is not None:
+            STATS.decrease_keys += 1
+        self.keys[node_id] = dist
+
+
+# Dijkstra's Heap implementation O(logV). The heap is arity-ary, a node at index i has its children at
+# arity * i + 1 through arity * i + arity, and index_array gives each node's position in the heap (None if it is not
+# in it)
 class PriorityHeap:
+    arity = 2
 
-    def __init__(self, nodes):
+    def __init__(self, dist):
         self.heap = []
         self.distances = []
-        self.min_index = 0
-        self.index_array = list(nodes.keys())
-        for node_id, dist in nodes.items():
-            self.insert(node_id, dist)
+        self.index_array = [None] * len(dist)
+
+    def __len__(self):
+        return len(self.heap)
 
-    # O(logV) with the call to bubble up (see bubble up), every other line is constant
+    # O(log_d V) with the call to bubble up (see bubble up), every other line is constant
     def insert(self, node_id, dist):
-        print("In H Insert")
+        if STATS is not None:
+            STATS.inserts += 1
         self.heap.append(node_id)
         self.distances.append(dist)
         self.index_array[node_id] = len(self.heap) - 1
         self.bubble_up(len(self.heap) - 1)
 
-    # O(logV) time complexity since we take the newly added node and only have to look at the nodes
-    # directly up to the root node.
+    # O(log_d V) time complexity since we take the newly added node and only have to look at the nodes
+    # directly up to the root node. The node is held aside while its ancestors move down into the gap, and written
+    # once where it stops, so each level costs one move instead of a full swap
     def bubble_up(self, index):
-        print("In H Bubble Up")
-        sorting = True
-        while sorting and index != 0:
-            if self.distances[index] < self.distances[(index - 1) // 2]:
-                self.switch(index, (index - 1) // 2)
-                index = (index - 1) // 2
+        heap, distances, index_array, arity = self.heap, self.distances, self.index_array, self.arity
+        node_id = heap[index]
+        dist = distances[index]
+        swaps = 0
+        while index != 0:
+            parent_index = (index - 1) // arity
+            parent_dist = distances[parent_index]
+            if dist < parent_dist:
+                parent = heap[parent_index]
+                heap[index] = parent
+                distances[index] = parent_dist
+                index_array[parent] = index
+                index = parent_index
+                swaps += 1
             else:
-                sorting = False
+                break
+        heap[index] = node_id
+        distances[index] = dist
+        index_array[node_id] = index
+        if STATS is not None:
+            STATS.swaps += swaps
 
-    # O(logV) time complexity since we call bubble_down (see bubble down), every other line is constant
+    # O(d log_d V) time complexity since we call bubble_down (see bubble down), every other line is constant
     def delete_min(self):
-        print("In H Delete")
-        min = self.heap[self.min_index]
-        if len(self.heap) == 1:
-            del self.heap[0]
-            return min
-        self.index_array[self.heap[-1]] = 0
-        self.index_array[self.heap[0]] = None
-        last = self.heap[-1]
-        last_dist = self.distances[-1]
-        self.heap[self.min_index] = last
-        self.distances[self.min_index] = last_dist
-        del self.heap[-1]
-        del self.distances[-1]
-        self.bubble_down(self.min_index)
+        if STATS is not None:
+            STATS.delete_mins += 1
+        min = self.heap[0]
+        last = self.heap.pop()
+        last_dist = self.distances.pop()
+        self.index_array[min] = None
+        if self.heap:
+            self.heap[0] = last
+            self.distances[0] = last_dist
+            self.index_array[last] = 0
+            self.bubble_down(0)
         return min
 
-    # O(logV) time complexity since we move the last node to the top and only have to look at a single child at each
-    # level until there are no more that are smaller, everything inside the loop is constant,
-    # including the switch function
+    # O(d log_d V) time complexity since we move the last node to the top and only have to look at the d children
+    # at each level until there are none that are smaller. Like bubble_up, the smaller children move up into the gap
+    # and the node is written once at the end
     def bubble_down(self, index):
-        print("In H Bubble Down")
-        while index < (len(self.heap) // 2):  # O(logV) times through
-            left_child = float('inf')
-            right_child = float('inf')
-            if ((2 * index) + 1) < len(self.distances):
-                left_child = self.distances[(2 * index) + 1]
-            if ((2 * index) + 2) < len(self.distances):
-                right_child = self.distances[(2 * index) + 2]
-            if left_child <= right_child:
-                min_child = left_child
-                child_index = (2 * index) + 1
-            else:
-                min_child = right_child
-                child_index = (2 * index) + 2
-            if min_child < self.distances[index]:
-                self.switch(child_index, index)
+        heap, distances, index_array, arity = self.heap, self.distances, self.index_array, self.arity
+        node_id = heap[index]
+        dist = distances[index]
+        size = len(heap)
+        swaps = 0
+        while True:
+            first_child = arity * index + 1
+            if first_child >= size:
+                break
+            child_index = first_child
+            child_dist = distances[first_child]
+            last_child = first_child + arity
+            if last_child > size:
+                last_child = size
+            for other in range(first_child + 1, last_child):
+                if distances[other] < child_dist:
+                    child_index = other
+                    child_dist = distances[other]
+            if child_dist < dist:
+                child = heap[child_index]
+                heap[index] = child
+                distances[index] = child_dist
+                index_array[child] = index
                 index = child_index
+                swaps += 1
             else:
-                return
+                break
+        heap[index] = node_id
+        distances[index] = dist
+        index_array[node_id] = index
+        if STATS is not None:
+            STATS.swaps += swaps
 
-    # O(logV) since we make a call to bubble up (see bubble up) every other line is constant
-    def decreaseKey(self, index, dist):
-        print("In H Decrease")
-        node = self.index_array[index]
-        if node is None:
+    # O(log_d V) since we make a call to bubble up (see bubble up) every other line is constant
+    def decreaseKey(self, node_id, dist):
+        index = self.index_array[node_id]
+        if index is None:
+            self.insert(node_id, dist)
             return
-        self.distances[node] = dist
-        self.bubble_up(node)  # O(logV)
-
-    # O(1) since all we do is change the values in our index_array, distances array, and heap
-    def switch(self, child_index, parent_index):
-        print("In H Switch")
-        parent = self.heap[parent_index]
-        child = self.heap[child_index]
-        self.index_array[parent] = child_index
-        self.index_array[child] = parent_index
-        temp = self.heap[child_index]
-        self.heap[child_index] = self.heap[parent_index]
-        self.heap[parent_index] = temp
-        temp = self.distances[child_index]
-        self.distances[child_index] = self.distances[parent_index]
-        self.distances[parent_index] = temp
+        if STATS is not None:
+            STATS.decrease_keys += 1
+        self.distances[index] = dist
+        self.bubble_up(index)
+
+
+# The same heap with four children per node. It is half as deep, so decreaseKey, which Dijkstra calls more than
+# delete_min on dense graphs, does fewer swaps, while delete_min looks at more children per level
+class DaryHeap(PriorityHeap):
+    arity = 4
+
+
+# heapq with lazy deletion. decreaseKey pushes a new entry instead of moving the old one, and delete_min drops the
+# entries that are out of date when they reach the top. O(logE) per operation, with at most one entry per relaxation
+class LazyHeap:
+
+    def __init__(self, dist):
+        self.dist = dist
+        self.queued = bytearray(len(dist))
+        self.size = 0
+        self.heap = []
+
+    def __len__(self):
+        return self.size
+
+    def delete_min(self):
+        if STATS is not None:
+            STATS.delete_mins += 1
+        stale = 0
+        while True:
+            node_dist, node_id = heapq.heappop(self.heap)
+            if self.queued[node_id] and node_dist == self.dist[node_id]:
+                break
+            stale += 1
+        if STATS is not None:
+            STATS.stale_pops += stale
+        self.queued[node_id] = 0
+        self.size -= 1
+        return node_id
+
+    def decreaseKey(self, node_id, dist):
+        if self.queued[node_id]:
+            if STATS is not None:
+                STATS.decrease_keys += 1
+        else:
+            self.queued[node_id] = 1
+            self.size += 1
+            if STATS is not None:
+                STATS.inserts += 1
+        heapq.heappush(self.heap, (dist, node_id))
+
+
+# Dial's bucket queue for graphs whose weights are all integers. Each node sits in the bucket for its distance, and
+# delete_min walks the buckets upward from the last distance it returned, which never goes back down since the
+# weights are not negative. O(1) per insert and decreaseKey, O(E + D) overall for the largest distance D. Buckets
+# are only made for distances that get used, so sparse distances cost nothing but the walk
+class BucketQueue:
+
+    def __init__(self, dist):
+        self.dist = dist
+        self.queued = bytearray(len(dist))
+        self.size = 0
+        self.buckets = {}
+        self.current = None
+
+    def __len__(self):
+        return self.size
+
+    def delete_min(self):
+        if STATS is not None:
+            STATS.delete_mins += 1
+        stale = 0
+        while True:
+            bucket = self.buckets.get(self.current)
+            while not bucket:
+                self.buckets.pop(self.current, None)
+                self.current += 1
+                bucket = self.buckets.get(self.current)
+            node_id = bucket.pop()
+            if self.queued[node_id] and self.dist[node_id] == self.current:
+                break
+            stale += 1
+        if STATS is not None:
+            STATS.stale_pops += stale
+        self.queued[node_id] = 0
+        self.size -= 1
+        return node_id
+
+    def decreaseKey(self, node_id, dist):
+        if dist != int(dist):
+            raise ValueError('BucketQueue needs integer edge weights, got distance {}'.format(dist))
+        dist = int(dist)
+        if self.queued[node_id]:
+            if STATS is not None:
+                STATS.decrease_keys += 1
+        else:
+            self.queued[node_id] = 1
+            self.size += 1
+            if STATS is not None:
+                STATS.inserts += 1
+        self.buckets.setdefault(dist, []).append(node_id)
+        if self.current is None or dist < self.current:
+            self.current = dist
+
+
+QUEUES = {'array': PriorityArray, 'heap': PriorityHeap, 'dary': DaryHeap, 'lazy': LazyHeap, 'bucket': BucketQueue}
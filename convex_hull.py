@@ -1,11 +1,14 @@
 from which_pyqt import PYQT_VER
 
 if PYQT_VER == 'PYQT6':
-    from PyQt6.QtCore import QLineF, QPointF, QObject
+    from PyQt6.QtCore import QLineF, QPointF, QObject, QTimer
 else:
     raise Exception('Unsupported Version of PyQt: {}'.format(PYQT_VER))
 
 import time
+import numpy as np
+
+from convex_hull_core import HullTrace, compute_hull_indices
 
 # Some global color constants that might be useful
 RED = (255, 0, 0)
@@ -17,65 +20,13 @@ BLUE = (0, 0, 255)
 PAUSE = 0.25
 
 
-# This function takes in the hulls, finds the upper and lower tangent and re-points the new tangent endpoints
-# to the opposite hull and throws out the middle points that are no longer necessary. n timei   in
-def merge(left_half, right_half):
-    # Prepare lower and upper tangents
-    upper_left = max(left_half, key=lambda p: p.point.x())
-    upper_right = min(right_half, key=lambda p: p.point.x())
-    bottom_left = upper_left
-    bottom_right = upper_right
-
-    # Finds upper tangent and stores points in upper_left and upper_right
-    while True:
-        last_l = upper_left
-        last_r = upper_right
-        if upper_right.rotate_cw:
-            while direction(upper_left, upper_right, upper_right.rotate_cw) < 0:
-                upper_right = upper_right.rotate_cw
-        if upper_left.rotate_ccw:
-            while direction(upper_right, upper_left, upper_left.rotate_ccw) > 0:
-                upper_left = upper_left.rotate_ccw
-
-        if upper_left == last_l and upper_right == last_r:
-            break
-
-    # Finds lower tangent and stores points in lower_left and lower_right
-    while True:
-        last_l = bottom_left
-        last_r = bottom_right
-        if bottom_right.rotate_ccw:
-            while direction(bottom_left, bottom_right, bottom_right.rotate_ccw) > 0:
-                bottom_right = bottom_right.rotate_ccw
-        if bottom_left.rotate_cw:
-            while direction(bottom_right, bottom_left, bottom_left.rotate_cw) < 0:
-                bottom_left = bottom_left.rotate_cw
-        if bottom_right == last_r and bottom_left == last_l:
-            break
-
-    # Adjusts the pointers to the correct tangent points to eliminate the middle points
-    upper_left.rotate_cw = upper_right
-    upper_right.rotate_ccw = upper_left
-    bottom_left.rotate_ccw = bottom_right
-    bottom_right.rotate_cw = bottom_left
-
-    # Creates array of the new combined hull's points
-    start = upper_left
-    result = []
-    while True:
-        result.append(upper_left)
-        upper_left = upper_left.rotate_ccw
-        if upper_left == start:
-            break
-    return result
-
-
 class ConvexHullSolver(QObject):
 
     # Class constructor
     def __init__(self):
         super().__init__()
         self.pause = False
+        self.replay_timer = None
 
     # Some helper methods that make calls to the GUI, allowing us to send updates
     # to be displayed.
@@ -110,59 +61,70 @@ class ConvexHullSolver(QObject):
         self.view = view
         assert (type(points) == list and type(points[0]) == QPointF)
 
+        # With pause on, the merges are only recorded while the hull is computed and are animated afterwards by
+        # startReplay, so the animation does not end up in the timings and compute_hull does not wait for it
+        self.stopReplay()
+        self.trace = HullTrace() if pause else None
+        self.timings = {}
         t1 = time.time()
-        # TODO: SORT THE POINTS BY INCREASING X-VALUE
-        points = sorted(points, key=lambda p: p.x())
+        # The hull itself is computed headless on a coordinate array, see convex_hull_core.py
+        coords = np.array([(p.x(), p.y()) for p in points], dtype=np.float64)
+        hull = compute_hull_indices(coords, prefilter=True, trace=self.trace, timings=self.timings)
         t2 = time.time()
-
+        polygon = [QLineF(points[hull[i]], points[hull[(i + 1) % len(hull)]]) for i in range(len(hull))]
         t3 = time.time()
-        # this is a dummy polygon of the first 3 unsorted points
-        # polygon = [QLineF(points[i], points[(i + 1) % 3]) for i in range(3)]
-        convex_hull = self.convex_hull(points)
-        # TODO: REPLACE THE LINE ABOVE WITH A CALL TO YOUR DIVIDE-AND-CONQUER CONVEX HULL SOLVER
-        convex_hull_points = []
-        for point in convex_hull:
-            convex_hull_points.append(point.point)
-        polygon = [QLineF(convex_hull_points[i], convex_hull_points[(i + 1)]) for i in
-                   range(len(convex_hull_points) - 1)]
-        polygon.append(QLineF(convex_hull_points[-1], convex_hull_points[0]))
-        t4 = time.time()
+        self.timings['polygon'] = t3 - t2
 
         # when passing lines to the display, pass a list of QLineF objects.  Each QLineF
         # object can be created with two QPointF objects corresponding to the endpoints
-        self.showHull(polygon, RED)
-        self.showText('Time Elapsed (Convex Hull): {:3.3f} sec'.format(t4 - t3))
-
-    # Splits an array of points down to 1 point and initiates the merge function. logn time
-    def convex_hull(self, points):
-        if len(points) == 1:
-            points[0] = Point(points[0])
-            return points
-        # TODO: RIGHT HERE
-        median = int(len(points) / 2)
-        left_half = self.convex_hull(points[0: median])
-        right_half = self.convex_hull(points[median:])
-        return merge(left_half, right_half)
-
-
-# Point class that store a QPointF object and pointers to the points on either side of the point. Constant Time
-class Point:
-    def __init__(self, p):
-        self.point = p
-        self.rotate_cw = None
-        self.rotate_ccw = None
-
-    def subtract(self, p):
-        check = QPointF(self.point.x() - p.point.x(), self.point.y() - p.point.y())
-        return check
-
-
-# Creates vector to show slope direction. Constant Time
-def cross_product(p1, p2):
-    return p1.x() * p2.y() - p2.x() * p1.y()
-
-
-# Finds a slope increase or decrease. Constant Time
-def direction(p1, p2, p3):
-    return cross_product(p3.subtract(p1), p2.subtract(p1))
-
+        if self.trace is not None:
+            self.startReplay(points, self.trace, polygon)
+        else:
+            self.showHull(polygon, RED)
+        self.showText('Time Elapsed (Convex Hull): {:3.3f} sec (sort {:3.3f}, merge {:3.3f}, polygon {:3.3f})'.format(
+            t3 - t1, self.timings['sort'], self.timings['merge'], self.timings['polygon']))
+
+    # Animates a recorded HullTrace: blinks every tangent the merges tried and shows each merged hull, then draws the
+    # final hull. A QTimer shows one event every PAUSE seconds from the GUI's event loop, so nothing sleeps and the
+    # caller gets control back right away. It only reads the trace, so it can run whenever the GUI wants
+    def startReplay(self, points, trace, polygon):
+        self.replay_points = points
+        self.replay_events = trace.replay()
+        self.replay_polygon = polygon
+        self.replay_lines = None
+        self.replay_timer = QTimer(self)
+        self.replay_timer.timeout.connect(self.replayStep)
+        self.replay_timer.start(int(PAUSE * 1000))
+
+    # Erases the lines of the last event and shows the next one, or the final hull once there are none left
+    def replayStep(self):
+        points = self.replay_points
+        if self.replay_lines is not None:
+            self.eraseHull(self.replay_lines)
+            self.replay_lines = None
+        for event, left, right, hull in self.replay_events:
+            if event == HullTrace.UPPER_CANDIDATE or event == HullTrace.LOWER_CANDIDATE:
+                self.replay_lines = [QLineF(points[left], points[right])]
+                self.view.addLines(self.replay_lines, BLUE)
+                return
+            if hull is not None and len(hull) > 1:
+                self.replay_lines = [QLineF(points[hull[i]], points[hull[(i + 1) % len(hull)]])
+                                     for i in range(len(hull))]
+                self.view.addLines(self.replay_lines, GREEN)
+                return
+        polygon = self.replay_polygon
+        self.stopReplay()
+        self.view.addLines(polygon, RED)
+
+    # Stops a replay that is still running, e.g. when a new hull is computed before the last animation finished
+    def stopReplay(self):
+        if self.replay_timer is None:
+            return
+        self.replay_timer.stop()
+        self.replay_timer.deleteLater()
+        self.replay_timer = None
+        if self.replay_lines is not None:
+            self.eraseHull(self.replay_lines)
+            self.replay_lines = None
+        self.replay_events = None
+        self.replay_polygon = None
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+
+import argparse
+import time
+
+import numpy as np
+
+from convex_hull_core import akl_toussaint_filter, compute_hull_indices, compute_hull_indices_parallel
+
+
+# Random point clouds like the ones the GUI generates
+def make_points(distribution, n, rng):
+    if distribution == 'uniform':
+        return rng.uniform(-1.0, 1.0, (n, 2))
+    if distribution == 'gaussian':
+        return rng.normal(0.0, 1.0, (n, 2))
+    if distribution == 'disk':
+        r = np.sqrt(rng.uniform(0.0, 1.0, n))
+        theta = rng.uniform(0.0, 2 * np.pi, n)
+        return np.column_stack((r * np.cos(theta), r * np.sin(theta)))
+    if distribution == 'grid':
+        # Integer points on a small grid, so there are many repeated points and many collinear hull points
+        side = max(2, int(np.sqrt(n)) // 4)
+        return rng.integers(0, side, (n, 2)).astype(np.float64)
+    raise ValueError('Unknown distribution: {}'.format(distribution))
+
+
+# Checks that hull is the strictly convex hull of points: no repeated vertices, a strict left turn at every vertex,
+# and every point on or to the left of every edge. A hull of one or two points must cover all the points. O(nh)
+def check_hull(points, hull):
+    vertices = points[hull]
+    assert len(np.unique(vertices, axis=0)) == len(hull), 'The hull repeats a point'
+    if len(hull) == 1:
+        assert (points == vertices[0]).all(), 'The hull is missing points'
+        return
+    if len(hull) == 2:
+        a, b = vertices
+        along = (points - a) @ (b - a)
+        assert ((b[0] - a[0]) * (points[:, 1] - a[1]) == (b[1] - a[1]) * (points[:, 0] - a[0])).all() and \
+            (along >= 0).all() and (along <= (b - a) @ (b - a)).all(), 'The hull is missing points'
+        return
+    for i in range(len(hull)):
+        a = vertices[i]
+        b = vertices[(i + 1) % len(hull)]
+        c = vertices[(i + 2) % len(hull)]
+        assert (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]) > 0, 'The hull is not strictly convex'
+        sides = (b[0] - a[0]) * (points[:, 1] - a[1]) - (b[1] - a[1]) * (points[:, 0] - a[0])
+        assert (sides >= 0).all(), 'A point is outside the hull'
+
+
+# Returns how many points survive the prefilter and the end-to-end hull time with and without it
+def compare_prefilter(points):
+    t1 = time.perf_counter()
+    kept = len(akl_toussaint_filter(points))
+    t2 = time.perf_counter()
+    with_filter = compute_hull_indices(points, prefilter=True)
+    t3 = time.perf_counter()
+    without_filter = compute_hull_indices(points)
+    t4 = time.perf_counter()
+    assert np.array_equal(with_filter, without_filter), 'The prefilter changed the hull'
+    check_hull(points, without_filter)
+    return {'n': len(points), 'kept': kept, 'filter_time': t2 - t1, 'prefilter_time': t3 - t2,
+            'full_time': t4 - t3}
+
+
+# Returns the serial and parallel hull times with the given number of workers
+def compare_parallel(points, workers):
+    t1 = time.perf_counter()
+    serial = compute_hull_indices(points)
+    t2 = time.perf_counter()
+    parallel = compute_hull_indices_parallel(points, workers=workers)
+    t3 = time.perf_counter()
+    assert np.array_equal(serial, parallel), 'The parallel hull differs from the serial one'
+    check_hull(points, parallel)
+    return {'n': len(points), 'serial_time': t2 - t1, 'parallel_time': t3 - t2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for convex_hull_core')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--distributions', nargs='+', default=['uniform', 'gaussian', 'disk', 'grid'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, nargs='*', default=[],
+                        help='also time compute_hull_indices_parallel with these worker counts')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print('{:<10} {:>10} {:>10} {:>8} {:>11} {:>12} {:>12} {:>8}'.format(
+        'points', 'n', 'kept', 'kept %', 'filter (s)', 'with (s)', 'without (s)', 'speedup'))
+    for distribution in args.distributions:
+        for n in args.sizes:
+            row = compare_prefilter(make_points(distribution, n, rng))
+            print('{:<10} {:>10} {:>10} {:>7.2f}% {:>11.4f} {:>12.4f} {:>12.4f} {:>7.1f}x'.format(
+                distribution, n, row['kept'], 100 * row['kept'] / n, row['filter_time'], row['prefilter_time'],
+                row['full_time'], row['full_time'] / row['prefilter_time']))
+
+    if args.workers:
+        print()
+        print('{:<10} {:>10} {:>8} {:>11} {:>13} {:>8}'.format(
+            'points', 'n', 'workers', 'serial (s)', 'parallel (s)', 'speedup'))
+    for workers in args.workers:
+        for distribution in args.distributions:
+            for n in args.sizes:
+                row = compare_parallel(make_points(distribution, n, rng), workers)
+                print('{:<10} {:>10} {:>8} {:>11.4f} {:>13.4f} {:>7.1f}x'.format(
+                    distribution, n, workers, row['serial_time'], row['parallel_time'],
+                    row['serial_time'] / row['parallel_time']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,582 @@
+import os
+import time
+import numpy as np
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# The divide-and-conquer convex hull behind ConvexHullSolver.compute_hull. It needs only NumPy, so it can run
+# without PyQt6. Points are kept as plain float lists sorted by x, and the cw/ccw links between hull points
+# are integer index arrays into those lists instead of pointers between Point objects.
+
+NO_LINK = -1
+
+# Below this many points per worker the parallel version just runs serially, the pool costs more than it saves
+MIN_POINTS_PER_WORKER = 50000
+
+# compute_hulls_batch hands sets bigger than this to compute_hull_indices, since its lockstep scan takes one pass of
+# the Python loop per point of the largest set
+BATCH_MAX_SET_SIZE = 1024
+
+
+# Turns points into an (N, 2) float64 array. Accepts an (N, 2) NumPy array, a flat buffer of interleaved
+# x, y doubles (bytes, bytearray, memoryview, array('d')), or any sequence of (x, y) pairs. Zero points is an
+# error unless allow_empty is set. O(n)
+def as_coordinates(points, allow_empty=False):
+    if isinstance(points, (bytes, bytearray, memoryview, array)):
+        coords = np.frombuffer(points, dtype=np.float64)
+    else:
+        coords = np.asarray(points, dtype=np.float64)
+    if coords.ndim == 1:
+        if coords.size % 2:
+            raise ValueError('A flat coordinate buffer needs an even number of values')
+        coords = coords.reshape(-1, 2)
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValueError('Expected an (N, 2) array of points, got shape {}'.format(coords.shape))
+    if len(coords) == 0 and not allow_empty:
+        raise ValueError('Cannot compute the hull of zero points')
+    return coords
+
+
+# Holds the x-sorted points and the cw/ccw links of the hulls built over them. Constant Time per point
+# If a HullTrace is given, every tangent the merges try is recorded in it
+class HullLinks:
+    def __init__(self, xs, ys, trace=None):
+        self.xs = xs
+        self.ys = ys
+        self.cw = array('q', [NO_LINK]) * len(xs)
+        self.ccw = array('q', [NO_LINK]) * len(xs)
+        self.trace = trace
+
+    # Builds the hull of all the sorted points bottom-up: first every pair of neighbouring points is merged, then
+    # every pair of neighbouring 2-point hulls, and so on, doubling the width each pass. Each hull is just an index
+    # range of the sorted points plus its links, so there is no recursion, no slicing and no lists to build.
+    # Returns the upper left tangent point of the last merge, which is always on the hull. O(nlogn) time
+    def build(self):
+        n = len(self.xs)
+        top = 0
+        width = 1
+        while width < n:
+            for lo in range(0, n - width, 2 * width):
+                top = self.merge(lo, lo + width, min(lo + 2 * width, n))
+            width *= 2
+        return top
+
+    # The tangent search of the original merge() for the hulls of lo..mid - 1 and mid..hi - 1.
+    # Since the points are sorted, the rightmost point of the left hull is mid - 1 and the leftmost point of the
+    # right hull is mid. Only the four tangent links are rewritten. O(n) time
+    # A walk also moves on to a collinear next point, but only outward (to a higher sorted index on the right hull,
+    # a lower one on the left), so tangents end at the outermost of collinear points and a walk never steps back and
+    # forth between two of them
+    def merge(self, lo, mid, hi):
+        xs = self.xs
+        ys = self.ys
+        cw = self.cw
+        ccw = self.ccw
+        trace = self.trace
+        upper_left = bottom_left = mid - 1
+        upper_right = bottom_right = mid
+
+        # Finds upper tangent
+        while True:
+            last_l = upper_left
+            last_r = upper_right
+            if cw[upper_right] != NO_LINK:
+                while True:
+                    turn = direction(xs, ys, upper_left, upper_right, cw[upper_right])
+                    if turn > 0 or (turn == 0 and cw[upper_right] < upper_right):
+                        break
+                    upper_right = cw[upper_right]
+            if ccw[upper_left] != NO_LINK:
+                while True:
+                    turn = direction(xs, ys, upper_right, upper_left, ccw[upper_left])
+                    if turn < 0 or (turn == 0 and ccw[upper_left] > upper_left):
+                        break
+                    upper_left = ccw[upper_left]
+            if trace is not None:
+                trace.record(HullTrace.UPPER_CANDIDATE, upper_left, upper_right)
+            if upper_left == last_l and upper_right == last_r:
+                break
+
+        # Finds lower tangent
+        while True:
+            last_l = bottom_left
+            last_r = bottom_right
+            if ccw[bottom_right] != NO_LINK:
+                while True:
+                    turn = direction(xs, ys, bottom_left, bottom_right, ccw[bottom_right])
+                    if turn < 0 or (turn == 0 and ccw[bottom_right] < bottom_right):
+                        break
+                    bottom_right = ccw[bottom_right]
+            if cw[bottom_left] != NO_LINK:
+                while True:
+                    turn = direction(xs, ys, bottom_right, bottom_left, cw[bottom_left])
+                    if turn > 0 or (turn == 0 and cw[bottom_left] > bottom_left):
+                        break
+                    bottom_left = cw[bottom_left]
+            if trace is not None:
+                trace.record(HullTrace.LOWER_CANDIDATE, bottom_left, bottom_right)
+            if bottom_right == last_r and bottom_left == last_l:
+                break
+
+        if trace is not None:
+            trace.record(HullTrace.UPPER_TANGENT, upper_left, upper_right)
+            trace.record(HullTrace.LOWER_TANGENT, bottom_left, bottom_right)
+
+        # Re-points the tangent endpoints to each other, which drops the points between them
+        cw[upper_left] = upper_right
+        ccw[upper_right] = upper_left
+        ccw[bottom_left] = bottom_right
+        cw[bottom_right] = bottom_left
+        return upper_left
+
+    # Links the points of a walk returned by walk into a cycle, so a hull built elsewhere can be merged. O(h)
+    def link_walk(self, walk):
+        if len(walk) == 1:
+            return
+        for i in range(len(walk)):
+            self.ccw[walk[i]] = walk[(i + 1) % len(walk)]
+            self.cw[walk[(i + 1) % len(walk)]] = walk[i]
+
+    # Returns the hull points in ccw order starting at start. O(h)
+    def walk(self, start):
+        ccw = self.ccw
+        result = [start]
+        current = ccw[start]
+        while current != NO_LINK and current != start:
+            result.append(current)
+            current = ccw[current]
+        return result
+
+
+# Finds a slope increase or decrease: the cross product of (p3 - p1) and (p2 - p1). Constant Time
+def direction(xs, ys, p1, p2, p3):
+    x1 = xs[p1]
+    y1 = ys[p1]
+    return (xs[p3] - x1) * (ys[p2] - y1) - (xs[p2] - x1) * (ys[p3] - y1)
+
+
+# Rotates a walk of sorted indices so it starts at the smallest one, which is the leftmost hull point. O(h)
+def leftmost_first(walk):
+    first = walk.index(min(walk))
+    return walk[first:] + walk[:first]
+
+
+# Sorts the points by x (then y) and returns the sort order along with the sorted x and y values as float lists.
+# Repeated points are dropped, only the first one in the input is kept, since the tangent search cannot tell copies
+# of the same point apart. O(nlogn)
+def sort_points(coords):
+    order = unique_order(coords)
+    return order, coords[order, 0].tolist(), coords[order, 1].tolist()
+
+
+# The lexsort order of coords by x then y, with every point after the first copy of a repeated point left out.
+# The sort is stable, so the copy kept is the one that comes first in coords. O(nlogn)
+def unique_order(coords):
+    order = np.lexsort((coords[:, 1], coords[:, 0]))
+    ordered = coords[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+    return order[first]
+
+
+# Akl-Toussaint heuristic. Finds the extreme points in x, y, x + y and x - y, which are all on the hull, and
+# returns the indices of the points that are not strictly inside the octagon they form. Every point strictly inside
+# it is also strictly inside the hull, so dropping them cannot change the result. O(n) time, all in NumPy
+def akl_toussaint_filter(coords):
+    x = coords[:, 0]
+    y = coords[:, 1]
+    s = x + y
+    d = x - y
+    # The extremes in ccw order around the hull
+    extremes = [np.argmin(x), np.argmin(s), np.argmin(y), np.argmax(d),
+                np.argmax(x), np.argmax(s), np.argmax(y), np.argmin(d)]
+    octagon = []
+    for i in extremes:
+        p = (coords[i, 0], coords[i, 1])
+        if not octagon or p != octagon[-1]:
+            octagon.append(p)
+    while len(octagon) > 1 and octagon[0] == octagon[-1]:
+        octagon.pop()
+    if len(octagon) < 3:
+        return np.arange(len(coords))
+
+    inside = np.ones(len(coords), dtype=bool)
+    for i in range(len(octagon)):
+        ax, ay = octagon[i]
+        bx, by = octagon[(i + 1) % len(octagon)]
+        inside &= (bx - ax) * (y - ay) - (by - ay) * (x - ax) > 0
+    return np.flatnonzero(~inside)
+
+
+# Returns the indices into points of the convex hull vertices in ccw order, starting from the leftmost one so the
+# result only depends on the hull and not on how it was built. With prefilter set, akl_toussaint_filter first throws
+# out the points that cannot be on the hull, so only the survivors are sorted and merged. O(nlogn) time and O(n) space
+# If trace is a HullTrace, the merge steps are recorded into it with indices into points. If timings is a dict,
+# the seconds spent in each phase are stored in it under 'prefilter', 'sort', 'merge' and 'walk'
+def compute_hull_indices(points, prefilter=False, trace=None, timings=None):
+    t1 = time.perf_counter()
+    coords = as_coordinates(points)
+    keep = None
+    if prefilter:
+        keep = akl_toussaint_filter(coords)
+        coords = coords[keep]
+    t2 = time.perf_counter()
+    order, xs, ys = sort_points(coords)
+    t3 = time.perf_counter()
+    links = HullLinks(xs, ys, trace)
+    top = links.build()
+    t4 = time.perf_counter()
+    hull = order[leftmost_first(links.walk(top))]
+    if keep is not None:
+        order = keep[order]
+        hull = keep[hull]
+    t5 = time.perf_counter()
+    if trace is not None:
+        trace.remap(order)
+    if timings is not None:
+        timings.update({'prefilter': t2 - t1, 'sort': t3 - t2, 'merge': t4 - t3, 'walk': t5 - t4})
+    return hull
+
+
+# A compact record of what the merges did, so the GUI can animate them afterwards instead of sleeping inside the
+# algorithm. Each event is an event type and two point indices: the left and right end of a tangent
+class HullTrace:
+    UPPER_CANDIDATE = 0
+    LOWER_CANDIDATE = 1
+    UPPER_TANGENT = 2
+    LOWER_TANGENT = 3
+
+    def __init__(self):
+        self.events = array('b')
+        self.left = array('q')
+        self.right = array('q')
+
+    def __len__(self):
+        return len(self.events)
+
+    # Constant Time
+    def record(self, event, left, right):
+        self.events.append(event)
+        self.left.append(left)
+        self.right.append(right)
+
+    # Maps the recorded indices through order, e.g. from sorted positions to indices into the input. O(events)
+    def remap(self, order):
+        self.left = array('q', np.asarray(order)[np.frombuffer(self.left, dtype=np.int64)].tolist())
+        self.right = array('q', np.asarray(order)[np.frombuffer(self.right, dtype=np.int64)].tolist())
+
+    # Yields (event, left, right, hull) for every recorded event. The links are rebuilt as the events go by, so
+    # hull is the list of point indices of the merged hull, in ccw order, after each LOWER_TANGENT and None otherwise
+    def replay(self):
+        cw = {}
+        ccw = {}
+        upper = None
+        for event, left, right in zip(self.events, self.left, self.right):
+            hull = None
+            if event == HullTrace.UPPER_TANGENT:
+                upper = (left, right)
+            elif event == HullTrace.LOWER_TANGENT:
+                upper_left, upper_right = upper
+                cw[upper_left] = upper_right
+                ccw[upper_right] = upper_left
+                ccw[left] = right
+                cw[right] = left
+                hull = [upper_left]
+                current = ccw[upper_left]
+                while current != upper_left:
+                    hull.append(current)
+                    current = ccw[current]
+            yield event, left, right, hull
+
+
+# Same result as compute_hull_indices, but the x-sorted points are split into one contiguous slab per worker and
+# each slab's hull is built in a separate process. The sorted coordinates go to the workers through shared memory,
+# so only the slab bounds and the hull vertices are pickled. The slab hulls are then joined here with the same
+# tangent merge, which only touches hull vertices. O(nlogn / P + h logP) time with P workers
+def compute_hull_indices_parallel(points, workers=None, prefilter=False):
+    coords = as_coordinates(points)
+    keep = None
+    if prefilter:
+        keep = akl_toussaint_filter(coords)
+        coords = coords[keep]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(coords) // MIN_POINTS_PER_WORKER)
+    if workers <= 1:
+        hull = compute_hull_indices(coords)
+        return hull if keep is None else keep[hull]
+
+    order = unique_order(coords)
+    workers = min(workers, len(order) // MIN_POINTS_PER_WORKER)
+    if workers <= 1:
+        # Too few distinct points to split, build serially from the order already sorted
+        links = HullLinks(coords[order, 0].tolist(), coords[order, 1].tolist())
+        hull = order[leftmost_first(links.walk(links.build()))]
+        return hull if keep is None else keep[hull]
+    shape = (len(order), 2)
+    bounds = [len(order) * i // workers for i in range(workers + 1)]
+    shm = shared_memory.SharedMemory(create=True, size=order.size * 16)
+    try:
+        sorted_coords = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        np.take(coords, order, axis=0, out=sorted_coords)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(slab_hull, shm.name, shape, bounds[i], bounds[i + 1])
+                       for i in range(workers)]
+            walks = [future.result() for future in futures]
+        # Only hull vertices are looked at from here on, so the merge indexes NumPy arrays instead of float lists
+        links = HullLinks(sorted_coords[:, 0].copy(), sorted_coords[:, 1].copy())
+        del sorted_coords
+    finally:
+        shm.close()
+        shm.unlink()
+
+    for walk in walks:
+        links.link_walk(walk)
+    top = walks[0][0]
+    width = 1
+    while width < workers:
+        for i in range(0, workers - width, 2 * width):
+            top = links.merge(bounds[i], bounds[i + width], bounds[min(i + 2 * width, workers)])
+        width *= 2
+    hull = order[leftmost_first(links.walk(top))]
+    return hull if keep is None else keep[hull]
+
+
+# Runs in a worker process: builds the hull of the sorted points lo..hi - 1 in shared memory and returns its
+# vertices as sorted indices in ccw order. O(nlogn) for n = hi - lo
+def slab_hull(name, shape, lo, hi):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        sorted_coords = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        links = HullLinks(sorted_coords[lo:hi, 0].tolist(), sorted_coords[lo:hi, 1].tolist())
+        del sorted_coords
+    finally:
+        shm.close()
+    return [lo + i for i in links.walk(links.build())]
+
+
+# Computes the hulls of many small point sets in one call. coords holds all the sets one after another and set s is
+# coords[offsets[s]:offsets[s + 1]], so offsets has one more entry than there are sets. Returns the hulls as a ragged
+# array in the same layout: hull s is indices[hull_offsets[s]:hull_offsets[s + 1]], indices into coords in ccw
+# order starting from the leftmost point, like compute_hull_indices.
+# Each set is sorted in place by batch_order, and then Andrew's monotone chain runs on every set at once:
+# step k pushes the k-th point of each set that has one onto that set's stack, after popping (across all sets in one
+# NumPy operation) whatever no longer turns left. The Python loop is over the points of the largest set, not over
+# the sets, so the per-set cost is a few array elements per step. Sets of more than BATCH_MAX_SET_SIZE points go
+# through compute_hull_indices one at a time instead. O(nlogn) time and O(n) space overall
+def compute_hulls_batch(coords, offsets):
+    coords = as_coordinates(coords, allow_empty=True)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    if offsets.ndim != 1 or len(offsets) < 1 or offsets[0] != 0 or offsets[-1] != len(coords) or (counts < 0).any():
+        raise ValueError('offsets must start at 0, never decrease and end at len(coords)')
+    if len(coords) == 0:
+        return np.empty(0, dtype=np.int64), np.zeros(len(offsets), dtype=np.int64)
+    large = np.flatnonzero(counts > BATCH_MAX_SET_SIZE)
+    large_hulls = [compute_hull_indices(coords[offsets[s]:offsets[s + 1]], prefilter=True) + offsets[s]
+                   for s in large.tolist()]
+    counts = counts.copy()
+    counts[large] = 0
+    order = batch_order(coords, offsets, counts)
+    xs = coords[order, 0]
+    ys = coords[order, 1]
+
+    # The sets are stepped through largest first, so the sets still going at step k are always a prefix
+    by_size = np.argsort(-counts, kind='stable')
+    starts = offsets[:-1][by_size]
+    sizes = counts[by_size]
+    active = np.searchsorted(-sizes, -np.arange(sizes[0] if len(sizes) else 0), side='left')
+    lower, lower_len = batch_chain(xs, ys, starts, sizes, active, False)
+    upper, upper_len = batch_chain(xs, ys, starts, sizes, active, True)
+
+    # The hull is the lower chain and then the upper chain, each without its last point. Sets whose hull would have
+    # fewer than two points, or two copies of one point, are reduced to their leftmost point
+    lower_len = np.maximum(lower_len - 1, 0)
+    upper_len = np.maximum(upper_len - 1, 0)
+    bottom = np.minimum(starts, len(xs) - 1)
+    first = np.where(sizes > 0, lower[bottom], 0)
+    second = np.where(sizes > 0, upper[bottom], 0)
+    degenerate = (sizes > 0) & ((lower_len + upper_len < 2) | ((lower_len + upper_len == 2) &
+                                                                (xs[first] == xs[second]) & (ys[first] == ys[second])))
+    lower_len[degenerate] = 1
+    upper_len[degenerate] = 0
+
+    hull_lens = np.empty(len(counts), dtype=np.int64)
+    hull_lens[by_size] = lower_len + upper_len
+    hull_lens[large] = [len(hull) for hull in large_hulls]
+    hull_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(hull_lens, out=hull_offsets[1:])
+    out_starts = hull_offsets[:-1][by_size]
+    indices = np.empty(hull_offsets[-1], dtype=np.int64)
+    indices[ragged_positions(out_starts, lower_len)] = order[lower[ragged_positions(starts, lower_len)]]
+    indices[ragged_positions(out_starts + lower_len, upper_len)] = order[upper[ragged_positions(starts, upper_len)]]
+    for s, hull in zip(large.tolist(), large_hulls):
+        indices[hull_offsets[s]:hull_offsets[s + 1]] = hull
+    return indices, hull_offsets
+
+
+# One monotone chain pass over every set at once. Set i covers the sorted positions starts[i]..starts[i] + sizes[i] - 1,
+# and active[k] is how many sets (from the front) have a k-th point. Each set's stack lives in the same positions of
+# the returned stack array, so it can never run into the next set's. The coordinates of the top two points of every
+# stack are also kept in their own arrays, so the usual case, a step that pops nothing, is plain slicing. With
+# reverse the points are taken from right to left, which gives the upper chain. Returns the stacks and their
+# lengths. O(n) array work for n points in all
+def batch_chain(xs, ys, starts, sizes, active, reverse):
+    stack = np.empty(len(xs), dtype=np.int64)
+    top = np.zeros(len(starts), dtype=np.int64)
+    top_x = np.zeros(len(starts))
+    top_y = np.zeros(len(starts))
+    second_x = np.zeros(len(starts))
+    second_y = np.zeros(len(starts))
+    for k in range(len(active)):
+        count = active[k]
+        base = starts[:count]
+        points = base + (sizes[:count] - 1 - k if reverse else k)
+        x = xs[points]
+        y = ys[points]
+        # Pops the top of every stack that would not turn left onto its new point, until none would. Only the sets
+        # that just popped can pop again
+        turn = ((top_x[:count] - second_x[:count]) * (y - second_y[:count]) -
+                (top_y[:count] - second_y[:count]) * (x - second_x[:count]))
+        sets = np.flatnonzero((turn <= 0) & (top[:count] >= 2))
+        while len(sets):
+            top[sets] -= 1
+            top_x[sets] = second_x[sets]
+            top_y[sets] = second_y[sets]
+            sets = sets[top[sets] >= 2]
+            below = stack[base[sets] + top[sets] - 2]
+            second_x[sets] = xs[below]
+            second_y[sets] = ys[below]
+            turn = (top_x[sets] - second_x[sets]) * (y[sets] - second_y[sets]) - \
+                (top_y[sets] - second_y[sets]) * (x[sets] - second_x[sets])
+            sets = sets[turn <= 0]
+        stack[base + top[:count]] = points
+        top[:count] += 1
+        second_x[:count] = top_x[:count]
+        second_y[:count] = top_y[:count]
+        top_x[:count] = x
+        top_y[:count] = y
+    return stack, top
+
+
+# The order that sorts every set by x then y without moving it out of its slice of coords (sets with a count of 0
+# are left as they are). Sets of similar size are padded into the rows of one 2D array and sorted along the rows,
+# which is far quicker than one lexsort over all the points with the set as the first key. Sizes are grouped by
+# powers of two, so the padding at most doubles the work. O(nlogn)
+def batch_order(coords, offsets, counts):
+    order = np.arange(len(coords))
+    size_class = np.ceil(np.log2(np.maximum(counts, 1))).astype(np.int64)
+    for cls in np.unique(size_class[counts > 0]):
+        sets = np.flatnonzero((size_class == cls) & (counts > 0))
+        starts = offsets[sets]
+        sizes = counts[sets]
+        valid = np.arange(sizes.max()) < sizes[:, None]
+        cells = starts[:, None] + np.minimum(np.arange(sizes.max()), sizes[:, None] - 1)
+        # The padding sorts after every real point, so the rows start with their set in sorted order
+        rows = np.lexsort((coords[cells, 1], coords[cells, 0], ~valid), axis=1)
+        order[ragged_positions(starts, sizes)] = (starts[:, None] + rows)[valid]
+    return order
+
+
+# The positions starts[i] + j for every i and 0 <= j < lengths[i], all in one array. O(sum of lengths)
+def ragged_positions(starts, lengths):
+    total = int(lengths.sum())
+    return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+
+
+# A convex hull that points can be added to as they arrive, without recomputing from scratch.
+# The hull is kept as its lower and upper chains, each a list of (x, y) sorted by x then y, running from the leftmost
+# to the rightmost hull point. Sorted chains let a binary search find the edge above and below a new point, so a
+# point inside the hull is rejected in O(logh). A point outside is spliced in at that position and the chain
+# neighbours it makes non-convex are removed, the same way merge() drops the points between its tangents.
+# Everything depends on the hull size h, never on how many points have been inserted.
+class IncrementalHull:
+    def __init__(self, points=None):
+        self.lower = []
+        self.upper = []
+        if points is not None:
+            self.insert(points)
+
+    def __len__(self):
+        return len(self.hull())
+
+    # Adds every point in points (anything as_coordinates accepts, including no points at all) and returns how many
+    # of them were outside the hull at the time they were added. O(logh) per rejected point, O(logh + h) worst case
+    # per added point
+    def insert(self, points):
+        added = 0
+        for p in map(tuple, as_coordinates(points, allow_empty=True).tolist()):
+            if self.insert_point(p):
+                added += 1
+        return added
+
+    # Adds one (x, y) tuple and returns True if it changed the hull
+    def insert_point(self, p):
+        lower = self.lower
+        upper = self.upper
+        if not lower:
+            lower.append(p)
+            upper.append(p)
+            return True
+        i = bisect_left(lower, p)
+        j = bisect_left(upper, p)
+        below = outside_chain(lower, i, p, 1)
+        above = outside_chain(upper, j, p, -1)
+        if not below and not above:
+            return False
+        if below:
+            splice_chain(lower, i, p, 1)
+        if above:
+            splice_chain(upper, j, p, -1)
+        return True
+
+    # Returns True if p is inside or on the hull. O(logh)
+    def contains(self, point):
+        p = (float(point[0]), float(point[1]))
+        if not self.lower:
+            return False
+        return (not outside_chain(self.lower, bisect_left(self.lower, p), p, 1) and
+                not outside_chain(self.upper, bisect_left(self.upper, p), p, -1))
+
+    # Returns the hull points as an (h, 2) array in ccw order starting from the leftmost one, like
+    # compute_hull_indices. O(h)
+    def hull(self):
+        if not self.lower:
+            return np.empty((0, 2))
+        points = self.lower + self.upper[-2:0:-1]
+        if len(points) == 2 and points[0] == points[1]:
+            points = points[:1]
+        return np.array(points, dtype=np.float64)
+
+
+# Tells whether p, which bisect_left put at position i of chain, lies outside it: past either end, or strictly on the
+# wrong side of the chain edge above or below it. sign is 1 for the lower chain (points must be on or above it) and
+# -1 for the upper chain (points must be on or below it). Constant Time
+def outside_chain(chain, i, p, sign):
+    if i == len(chain):
+        return True
+    if chain[i] == p:
+        return False
+    if i == 0:
+        return True
+    (ax, ay), (bx, by) = chain[i - 1], chain[i]
+    return sign * ((bx - ax) * (p[1] - ay) - (by - ay) * (p[0] - ax)) < 0
+
+
+# Inserts p into chain at position i and removes the neighbours on either side that no longer turn the right way.
+# O(logh + k) for k removed points, plus the list shifts
+def splice_chain(chain, i, p, sign):
+    lo = i
+    while lo >= 2 and sign * turn(chain[lo - 2], chain[lo - 1], p) <= 0:
+        lo -= 1
+    hi = i
+    while hi + 1 < len(chain) and sign * turn(p, chain[hi], chain[hi + 1]) <= 0:
+        hi += 1
+    chain[lo:hi] = [p]
+
+
+# The cross product of (b - a) and (c - a): positive for a left turn a -> b -> c. Constant Time
+def turn(a, b, c):
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
@@ -1,5 +1,54 @@
 import random
 import math
+import os
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Numbers below this are decided straight from the small prime table
+SMALL_PRIME_LIMIT = 1000
+
+# How many candidates are sent to a worker process at once
+BATCH_CHUNK_SIZE = 256
+
+# How many numbers the segmented sieve marks at a time
+SEGMENT_SIZE = 1 << 16
+
+# Residues mod 30 that are coprime to 2, 3 and 5, used to skip candidates with those factors
+WHEEL = 30
+WHEEL_RESIDUES = (1, 7, 11, 13, 17, 19, 23, 29)
+
+
+# Operation counters for the benchmark. Counting is off unless enable_stats has been called, and when it is on
+# mod_exp and the strong tests only add to them once per call, so the hot loops are not slowed down
+class PrimalityStats:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.mod_exp_calls = 0
+        self.multiplications = 0
+        self.reductions = 0
+        self.rounds = 0
+
+    def as_dict(self):
+        return {'mod_exp_calls': self.mod_exp_calls, 'multiplications': self.multiplications,
+                'reductions': self.reductions, 'rounds': self.rounds}
+
+
+STATS = None
+
+
+# Starts counting into stats (a new PrimalityStats if none is given) and returns it
+def enable_stats(stats=None):
+    global STATS
+    STATS = stats if stats is not None else PrimalityStats()
+    return STATS
+
+
+def disable_stats():
+    global STATS
+    STATS = None
 
 
 def prime_test(N, k):
@@ -7,14 +56,238 @@ def prime_test(N, k):
     return fermat(N, k), miller_rabin(N, k)
 
 
+# Tests every number in numbers and yields one (fermat, miller_rabin) result per number, in input order.
+# Numbers with a small factor are rejected in this process by small_prime_check, only the survivors are sent to
+# the worker processes. At most 2 chunks per worker are in flight at a time, so numbers can be any iterable
+# (even a generator of millions of candidates) and memory stays bounded by the chunk size, not the input size.
+# With workers set to 0 or 1 everything runs in this process
+def prime_test_many(numbers, k, workers=None, chunksize=BATCH_CHUNK_SIZE):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = split_chunks(numbers, chunksize)
+    if workers <= 1:
+        for chunk in chunks:
+            results, survivors = prefilter_chunk(chunk)
+            fill_results(results, prime_test_chunk(survivors, k))
+            yield from results
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            results, survivors = prefilter_chunk(chunk)
+            future = pool.submit(prime_test_chunk, survivors, k) if survivors else None
+            pending.append((results, future))
+            while len(pending) >= 2 * workers:
+                yield from finish_chunk(*pending.popleft())
+        while pending:
+            yield from finish_chunk(*pending.popleft())
+
+
+# Runs prime_test on each number. This is what the worker processes run. O(len(numbers) * kn^3)
+def prime_test_chunk(numbers, k):
+    return [prime_test(N, k) for N in numbers]
+
+
+# Decides N from the small prime table alone if it can, returns 'prime', 'composite' or None when N needs a real
+# test. The gcd with the product of all the small primes checks every small factor at once in O(n^2)
+def small_prime_check(N):
+    if N <= SMALL_PRIME_LIMIT:
+        return 'prime' if N in SMALL_PRIME_SET else 'composite'
+    if math.gcd(N, SMALL_PRIMORIAL) != 1:
+        return 'composite'
+    if N < SMALL_PRIME_LIMIT * SMALL_PRIME_LIMIT:
+        return 'prime'
+    return None
+
+
+# Splits an iterable into lists of at most size items without reading ahead further than one chunk
+def split_chunks(numbers, size):
+    chunk = []
+    for N in numbers:
+        chunk.append(N)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Returns the results for a chunk, with None left where a number still has to be tested, and the list of
+# numbers that still have to be tested
+def prefilter_chunk(chunk):
+    results = []
+    survivors = []
+    for N in chunk:
+        verdict = small_prime_check(N)
+        if verdict is None:
+            survivors.append(N)
+            results.append(None)
+        else:
+            results.append((verdict, verdict))
+    return results, survivors
+
+
+# Puts the survivors' results back into the None slots of results, in order
+def fill_results(results, tested):
+    tested = iter(tested)
+    for i in range(len(results)):
+        if results[i] is None:
+            results[i] = next(tested)
+    return results
+
+
+def finish_chunk(results, future):
+    if future is not None:
+        fill_results(results, future.result())
+    return results
+
+
+# Sieve of Eratosthenes for the small prime table. O(n log log n) time and O(n) space
+def sieve(limit):
+    is_prime = bytearray([1]) * (limit + 1)
+    is_prime[0:2] = b'\x00\x00'
+    for p in range(2, math.isqrt(limit) + 1):
+        if is_prime[p]:
+            is_prime[p * p::p] = bytes(len(range(p * p, limit + 1, p)))
+    return [p for p in range(limit + 1) if is_prime[p]]
+
+
+# Yields the primes p with lo <= p < hi in increasing order using a segmented sieve.
+# Each segment of SEGMENT_SIZE numbers is crossed off by the base primes up to sqrt(hi) and then thrown away, so
+# memory is O(SEGMENT_SIZE + sqrt(hi)) no matter how wide the range is. O((hi - lo) log log hi + sqrt(hi)) time
+def primes_in_range(lo, hi):
+    lo = max(lo, 2)
+    if hi <= lo:
+        return
+    base_primes = sieve(math.isqrt(hi - 1))
+    for seg_lo in range(lo, hi, SEGMENT_SIZE):
+        seg_hi = min(seg_lo + SEGMENT_SIZE, hi)
+        segment = bytearray([1]) * (seg_hi - seg_lo)
+        for p in base_primes:
+            start = max(p * p, (seg_lo + p - 1) // p * p)
+            if start >= seg_hi:
+                if p * p >= seg_hi:
+                    break
+                continue
+            segment[start - seg_lo::p] = bytes(len(range(start, seg_hi, p)))
+        yield from itertools.compress(range(seg_lo, seg_hi), segment)
+
+
+# Yields the numbers >= start that are not divisible by 2, 3 or 5, in increasing order. Constant Time per number
+def wheel_candidates(start):
+    base = start - start % WHEEL
+    while True:
+        for r in WHEEL_RESIDUES:
+            if base + r >= start:
+                yield base + r
+        base += WHEEL
+
+
+# Yields every prime greater than n in increasing order, forever. Candidates come off the mod 30 wheel, so only
+# 8 of every 30 numbers are looked at, and each one goes through deterministic_miller_rabin. O(n^4) per prime
+# since about n candidates are tested per prime found
+def prime_stream(n):
+    for p in (2, 3, 5):
+        if p > n:
+            yield p
+    for candidate in wheel_candidates(max(n + 1, 7)):
+        if deterministic_miller_rabin(candidate) == 'prime':
+            yield candidate
+
+
+# Returns the smallest prime greater than n
+def next_prime(n):
+    return next(prime_stream(n))
+
+
+# Returns a random prime with exactly the given number of bits, by taking the next prime after a random
+# starting point and starting over if that runs past 2^bits. The starting point comes from the operating system's
+# random source by default, so the prime can be used as a key. Pass a seeded random.Random as rng to get the same
+# primes on every run, e.g. for tests and benchmarks
+def random_prime(bits, rng=None):
+    if bits < 2:
+        raise ValueError('A prime needs at least 2 bits')
+    if rng is None:
+        rng = random.SystemRandom()
+    while True:
+        p = next_prime(rng.randrange(1 << (bits - 1), 1 << bits) - 1)
+        if p < 1 << bits:
+            return p
+
+
+SMALL_PRIMES = sieve(SMALL_PRIME_LIMIT)
+SMALL_PRIME_SET = frozenset(SMALL_PRIMES)
+SMALL_PRIMORIAL = math.prod(SMALL_PRIMES)
+
+
 # The mod_exp function has a time complexity O(n^3)
-# The function does O(n) recursive calls with y being halved
-# And each recursive call take O(n^2) because of the multiplication
-# The space complexity of the algorithm is O(n) because each recursive call creates a new x, y, and N to be stored
+# It scans the bits of y once from the most significant end, so there is no recursion and no depth limit.
+# Runs of bits are consumed a window at a time: every bit costs one squaring, but a multiplication is only done
+# once per window (about n / (w + 1) of them) using a table of the odd powers x^1, x^3, ..., x^(2^w - 1).
+# Each squaring or multiplication is O(n^2) and is reduced right away with %, so z never grows past N^2.
+# The space complexity is O(2^w * n) for the window table, w is at most 6
 def mod_exp(x, y, N):
+    if N == 1:
+        return 0
+    x %= N
+    if y == 0:
+        return 1
+    w = window_size(y.bit_length())
+    # Precompute the odd powers x^1, x^3, ..., x^(2^w - 1)
+    table = [x]
+    if w > 1:
+        x2 = x * x % N
+        for _ in range((1 << (w - 1)) - 1):
+            table.append(table[-1] * x2 % N)
+
+    z = 1
+    windows = 0
+    i = y.bit_length() - 1
+    while i >= 0:
+        if not (y >> i) & 1:
+            z = z * z % N  # O(n^2)
+            i -= 1
+            continue
+        # Take the longest window y[i..j] of at most w bits that ends in a 1
+        j = max(i - w + 1, 0)
+        while not (y >> j) & 1:
+            j += 1
+        for _ in range(i - j + 1):
+            z = z * z % N  # O(n^2)
+        z = z * table[((y >> j) & ((1 << (i - j + 1)) - 1)) >> 1] % N  # O(n^2)
+        windows += 1
+        i = j - 1
+
+    if STATS is not None:
+        # One squaring per bit, one multiplication per window and the table, each reduced once
+        count = y.bit_length() + windows + len(table) - (w == 1)
+        STATS.mod_exp_calls += 1
+        STATS.multiplications += count
+        STATS.reductions += count
+    return z
+
+
+# Picks the sliding window width for an exponent of the given bit length. Constant Time
+# Wider windows save multiplications but the table costs 2^(w - 1) multiplications to build
+def window_size(bits):
+    if bits <= 16:
+        return 1
+    if bits <= 64:
+        return 3
+    if bits <= 256:
+        return 4
+    if bits <= 1024:
+        return 5
+    return 6
+
+
+# The original recursive version of mod_exp, kept only so the benchmark can compare against it.
+# Reducing with repeated subtraction takes O(z / N) steps, so it is only usable for very small N
+def mod_exp_recursive(x, y, N):
     if y == 0:
         return 1
-    z = mod_exp(x, math.floor(y / 2), N)  # O(n) times called recursively
+    z = mod_exp_recursive(x, math.floor(y / 2), N)  # O(n) times called recursively
     if y % 2 == 0:
         z *= z  # O(n^2)
         if z > N:
@@ -48,32 +321,153 @@ def mprobability(k):
 # The fermat funciton has a time complexity of O(kn^3)
 # The function loops through the for loop k times
 # And in each loop it calls the mod_exp function with a time complexity O(n^3)
-# The space complexity is O(n) because recursion takes place in the mod_exp function
+# The space complexity is O(1) besides the window table in the mod_exp function
 def fermat(N, k):
     for a in range(k):  # O(k)
+        if STATS is not None:
+            STATS.rounds += 1
         a = random.randint(1, N - 1)
         if mod_exp(a, N - 1, N) != 1:  # O(n^3)
             return 'composite'
     return 'prime'
 
 
-# The miller_rabin function has a time complexity of O(kn^4)
+# The miller_rabin function has a time complexity of O(kn^3)
 # The function loops through the for loop k times
-# For each k time through we run through the while loop n times
-# And call the mod_exp function O(n^3)
-# The space complexity is O(n) because recursion takes place in the mod_exp function
-def miller_rabin(N, k):
+# Each time through it computes a^d once with mod_exp, O(n^3), and then squares it at most n times, O(n^2) each
+# With deterministic set, the random rounds are replaced by deterministic_miller_rabin and k is ignored
+# The space complexity is O(1) besides the window table in the mod_exp function
+def miller_rabin(N, k, deterministic=False):
+    if deterministic:
+        return deterministic_miller_rabin(N)
+    if N < 4:
+        return 'prime' if N >= 2 else 'composite'
+    if N % 2 == 0:
+        return 'composite'
+    d, s = split_power_of_two(N - 1)
     for a in range(k):  # O(k)
-        t = N - 1
-        a = random.randint(1, t)
-        if mod_exp(a, t, N) != 1:  # O(n^3)
+        a = random.randint(1, N - 1)
+        if not strong_probable_prime(N, a, d, s):  # O(n^3)
             return 'composite'
-        while t % 2 == 0:  # O(n)
-            t /= 2
-            i = mod_exp(a, t, N)  # O(n^3)
-            if i == N - 1:
-                break
-            else:
-                if i != 1:
-                    return 'composite'
     return 'prime'
+
+
+# Bases that make the strong test exact for every N below 2^64 (they are correct up to 3.3 * 10^24)
+DETERMINISTIC_WITNESSES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+
+# The deterministic_miller_rabin function has a time complexity of O(n^3)
+# Below 2^64 it runs the strong test with the 12 fixed DETERMINISTIC_WITNESSES, which is proven exact.
+# Above that it runs Baillie-PSW: one strong test to base 2 and a strong Lucas test, which has no known
+# counterexample. Either way there is no randomness, so the answer is the same on every run
+# The space complexity is O(1) besides the window table in the mod_exp function
+def deterministic_miller_rabin(N):
+    verdict = small_prime_check(N)
+    if verdict is not None:
+        return verdict
+    d, s = split_power_of_two(N - 1)
+    if N < 1 << 64:
+        for a in DETERMINISTIC_WITNESSES:
+            if not strong_probable_prime(N, a, d, s):
+                return 'composite'
+        return 'prime'
+    if not strong_probable_prime(N, 2, d, s) or not strong_lucas_probable_prime(N):
+        return 'composite'
+    return 'prime'
+
+
+# Writes M as d * 2^s with d odd. O(n)
+def split_power_of_two(M):
+    s = (M & -M).bit_length() - 1
+    return M >> s, s
+
+
+# Strong probable prime test of odd N to base a, where N - 1 = d * 2^s. O(n^3)
+# a^d is computed once, then squared up to s - 1 times looking for N - 1
+def strong_probable_prime(N, a, d, s):
+    if STATS is not None:
+        STATS.rounds += 1
+    x = mod_exp(a, d, N)  # O(n^3)
+    if x == 1 or x == N - 1:
+        return True
+    squarings = 0
+    result = False
+    for _ in range(s - 1):  # O(n) squarings, O(n^2) each
+        x = x * x % N
+        squarings += 1
+        if x == N - 1:
+            result = True
+            break
+        if x == 1:
+            break
+    if STATS is not None:
+        STATS.multiplications += squarings
+        STATS.reductions += squarings
+    return result
+
+
+# Strong Lucas probable prime test of odd N with Selfridge's parameters P = 1, Q = (1 - D) / 4. O(n^3)
+# D is the first of 5, -7, 9, -11, ... with Jacobi symbol (D / N) = -1
+def strong_lucas_probable_prime(N):
+    if math.isqrt(N) ** 2 == N:
+        return False
+    D = 5
+    while True:
+        j = jacobi(D, N)
+        if j == -1:
+            break
+        if j == 0 and abs(D) != N:
+            return False
+        D = -D - 2 if D > 0 else -D + 2
+    P = 1
+    Q = (1 - D) // 4
+    d, s = split_power_of_two(N + 1)
+
+    if STATS is not None:
+        # 3 products per bit of d and 2 more per set bit, then up to 2 per extra doubling
+        count = 3 * (d.bit_length() - 1) + 2 * (bin(d).count('1') - 1) + 2 * (s - 1)
+        STATS.rounds += 1
+        STATS.multiplications += count
+        STATS.reductions += count
+
+    # Walk the bits of d computing U_k, V_k and Q^k mod N, doubling k and adding 1 where the bit is set
+    U, V, Qk = 1, P, Q % N
+    for bit in bin(d)[3:]:
+        U = U * V % N
+        V = (V * V - 2 * Qk) % N
+        Qk = Qk * Qk % N
+        if bit == '1':
+            U, V = half_mod(P * U + V, N), half_mod(D * U + P * V, N)
+            Qk = Qk * Q % N
+
+    if U == 0 or V == 0:
+        return True
+    for _ in range(s - 1):
+        V = (V * V - 2 * Qk) % N
+        if V == 0:
+            return True
+        Qk = Qk * Qk % N
+    return False
+
+
+# x / 2 mod odd N. Constant Time
+def half_mod(x, N):
+    if x % 2:
+        x += N
+    return (x // 2) % N
+
+
+# Jacobi symbol (a / n) for odd positive n. O(n^2)
+def jacobi(a, n):
+    a %= n
+    result = 1
+    while a:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+
+from fermat import (mod_exp, mod_exp_recursive, fermat, miller_rabin, deterministic_miller_rabin, random_prime,
+                    next_prime, small_prime_check, enable_stats, disable_stats, SMALL_PRIME_LIMIT)
+
+# The recursive version reduces by repeated subtraction, which takes about N^2 steps per call,
+# so it is only timed up to this many bits by default
+LEGACY_MAX_BITS = 10
+
+SUITE_BITS = [32, 64, 128, 256, 512, 1024, 2048, 4096]
+
+# Chernick Carmichael numbers need three primes of a third of the bits each, which gets too slow to search for
+# past this size, so larger bit lengths skip the carmichael category by default
+CARMICHAEL_MAX_BITS = 512
+
+# How many random numbers random_composite tries before giving up on a bit length where they are too rare
+COMPOSITE_ATTEMPTS = 1 << 16
+
+# The functions timed by the suite, each called as fn(N, k)
+SUITE_FUNCTIONS = {
+    'fermat': fermat,
+    'miller_rabin': miller_rabin,
+    'deterministic_miller_rabin': lambda N, k: deterministic_miller_rabin(N),
+    'mod_exp': lambda N, k: mod_exp(2, N - 1, N),
+}
+
+
+# Times fn(x, y, N) over the given cases and returns the average seconds per call
+def time_calls(fn, cases, repeat):
+    t1 = time.perf_counter()
+    for _ in range(repeat):
+        for x, y, N in cases:
+            fn(x, y, N)
+    t2 = time.perf_counter()
+    return (t2 - t1) / (repeat * len(cases))
+
+
+# Builds random (x, N - 1, N) cases with an odd modulus of exactly the given bit length
+def make_cases(bits, count, rng):
+    cases = []
+    for _ in range(count):
+        N = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+        cases.append((rng.randint(1, N - 1), N - 1, N))
+    return cases
+
+
+def compare_mod_exp(bit_lengths, count=20, repeat=3, legacy_max_bits=LEGACY_MAX_BITS, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for bits in bit_lengths:
+        cases = make_cases(bits, count, rng)
+        row = {'bits': bits, 'mod_exp': time_calls(mod_exp, cases, repeat), 'pow': time_calls(pow, cases, repeat)}
+        if bits <= legacy_max_bits:
+            row['mod_exp_recursive'] = time_calls(mod_exp_recursive, cases, repeat)
+        rows.append(row)
+    return rows
+
+
+# Returns a Chernick Carmichael number (6m + 1)(12m + 1)(18m + 1) with exactly the given number of bits, or None
+# if there is none. The product is Carmichael whenever all three factors are prime. Every m that gives the right
+# bit length is tried at most once, starting from a random one and wrapping around, so the search always ends
+def carmichael_number(bits, rng):
+    if bits < 11:
+        return None
+    m_lo = first_m(1 << (bits - 1))
+    m_hi = first_m(1 << bits)
+    if m_lo >= m_hi:
+        return None
+    start = rng.randrange(m_lo, m_hi)
+    for offset in range(m_hi - m_lo):
+        m = m_lo + (start - m_lo + offset) % (m_hi - m_lo)
+        factors = (6 * m + 1, 12 * m + 1, 18 * m + 1)
+        if all(small_prime_check(f) != 'composite' and deterministic_miller_rabin(f) == 'prime' for f in factors):
+            return factors[0] * factors[1] * factors[2]
+    return None
+
+
+# The smallest m >= 1 with (6m + 1)(12m + 1)(18m + 1) >= N, by binary search. O(logN) steps
+def first_m(N):
+    lo = 1
+    hi = 1
+    while (6 * hi + 1) * (12 * hi + 1) * (18 * hi + 1) < N:
+        hi *= 2
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if (6 * mid + 1) * (12 * mid + 1) * (18 * mid + 1) < N:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+# Returns an odd composite with exactly the given number of bits and no factor below the small prime limit,
+# so the tests cannot reject it by trial division and have to do the real work. Such a number is at least the
+# square of the first prime past the limit, so for fewer bits there is none and None is returned. Just past that
+# size they are very rare, so after COMPOSITE_ATTEMPTS random tries it gives up and returns None as well
+def random_composite(bits, rng):
+    if next_prime(SMALL_PRIME_LIMIT) ** 2 >= 1 << bits:
+        return None
+    for _ in range(COMPOSITE_ATTEMPTS):
+        N = rng.getrandbits(bits) | (1 << (bits - 1)) | 1
+        if small_prime_check(N) is None and deterministic_miller_rabin(N) == 'composite':
+            return N
+    return None
+
+
+def make_inputs(category, bits, samples, rng, carmichael_max_bits):
+    if category == 'prime':
+        return [random_prime(bits, rng) for _ in range(samples)]
+    if category == 'carmichael':
+        if bits > carmichael_max_bits:
+            return []
+        numbers = [carmichael_number(bits, rng) for _ in range(samples)]
+        return [N for N in numbers if N is not None]
+    numbers = [random_composite(bits, rng) for _ in range(samples)]
+    return [N for N in numbers if N is not None]
+
+
+# Times one function over the inputs, repeat times, and returns its timing and per-call counters
+def measure(name, fn, numbers, k, repeat):
+    stats = enable_stats()
+    try:
+        for N in numbers:
+            fn(N, k)
+        counters = stats.as_dict()
+    finally:
+        disable_stats()
+    calls = len(numbers)
+    t1 = time.perf_counter()
+    for _ in range(repeat):
+        for N in numbers:
+            fn(N, k)
+    seconds = (time.perf_counter() - t1) / repeat
+    return {
+        'function': name,
+        'calls': calls,
+        'seconds': seconds,
+        'tests_per_sec': calls / seconds if seconds > 0 else float('inf'),
+        'per_call': {key: value / calls for key, value in counters.items()},
+    }
+
+
+# Runs every function in SUITE_FUNCTIONS on primes, Carmichael numbers and random composites of each bit length.
+# Counters are collected on a separate pass from the timed ones, so counting does not show up in the timings
+def run_suite(bit_lengths=SUITE_BITS, samples=5, k=20, repeat=1, seed=0, carmichael_max_bits=CARMICHAEL_MAX_BITS):
+    rng = random.Random(seed)
+    results = []
+    for bits in bit_lengths:
+        for category in ('prime', 'carmichael', 'composite'):
+            numbers = make_inputs(category, bits, samples, rng, carmichael_max_bits)
+            if not numbers:
+                continue
+            for name, fn in SUITE_FUNCTIONS.items():
+                row = measure(name, fn, numbers, k, repeat)
+                row['bits'] = bits
+                row['category'] = category
+                results.append(row)
+    return {'meta': run_metadata(k, samples, repeat, seed), 'results': results}
+
+
+def run_metadata(k, samples, repeat, seed):
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {'revision': revision, 'python': platform.python_version(), 'timestamp': time.time(),
+            'k': k, 'samples': samples, 'repeat': repeat, 'seed': seed}
+
+
+# Prints the change in throughput for every (function, category, bits) row that is in both runs
+def compare_runs(old, new):
+    old_rows = {(r['function'], r['category'], r['bits']): r for r in old['results']}
+    print('{:<28} {:<11} {:>6} {:>14} {:>14} {:>9}'.format('function', 'category', 'bits', 'old tests/s',
+                                                         'new tests/s', 'speedup'))
+    for row in new['results']:
+        key = (row['function'], row['category'], row['bits'])
+        if key not in old_rows:
+            continue
+        before = old_rows[key]['tests_per_sec']
+        print('{:<28} {:<11} {:>6} {:>14.1f} {:>14.1f} {:>8.2f}x'.format(*key, before, row['tests_per_sec'],
+                                                                       row['tests_per_sec'] / before))
+
+
+def print_suite(run):
+    print('{:<28} {:<11} {:>6} {:>12} {:>10} {:>10} {:>7}'.format('function', 'category', 'bits', 'tests/s',
+                                                                'mults', 'reductions', 'rounds'))
+    for row in run['results']:
+        per_call = row['per_call']
+        print('{:<28} {:<11} {:>6} {:>12.1f} {:>10.1f} {:>10.1f} {:>7.1f}'.format(
+            row['function'], row['category'], row['bits'], row['tests_per_sec'], per_call['multiplications'],
+            per_call['reductions'], per_call['rounds']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the fermat module')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    suite = commands.add_parser('suite', help='time the primality tests across bit lengths and inputs')
+    suite.add_argument('--bits', type=int, nargs='+', default=SUITE_BITS)
+    suite.add_argument('--samples', type=int, default=5)
+    suite.add_argument('--k', type=int, default=20)
+    suite.add_argument('--repeat', type=int, default=1)
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--carmichael-max-bits', type=int, default=CARMICHAEL_MAX_BITS)
+    suite.add_argument('--output', help='write the results to this JSON file')
+
+    compare = commands.add_parser('compare', help='compare two JSON results files')
+    compare.add_argument('old')
+    compare.add_argument('new')
+
+    legacy = commands.add_parser('mod-exp', help='compare mod_exp against the old recursive version')
+    legacy.add_argument('--bits', type=int, nargs='+', default=[8, 10, 32, 64, 128, 256, 512, 1024, 2048])
+    legacy.add_argument('--count', type=int, default=20)
+    legacy.add_argument('--repeat', type=int, default=3)
+    legacy.add_argument('--legacy-max-bits', type=int, default=LEGACY_MAX_BITS)
+    args = parser.parse_args()
+
+    if args.command == 'suite':
+        run = run_suite(args.bits, args.samples, args.k, args.repeat, args.seed, args.carmichael_max_bits)
+        print_suite(run)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(run, f, indent=2)
+    elif args.command == 'compare':
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        compare_runs(old, new)
+    else:
+        print('{:>6} {:>14} {:>14} {:>18}'.format('bits', 'mod_exp (us)', 'pow (us)', 'recursive (us)'))
+        for row in compare_mod_exp(args.bits, args.count, args.repeat, args.legacy_max_bits):
+            legacy_time = row.get('mod_exp_recursive')
+            print('{:>6} {:>14.2f} {:>14.2f} {:>18}'.format(
+                row['bits'], row['mod_exp'] * 1e6, row['pow'] * 1e6,
+                '{:.2f}'.format(legacy_time * 1e6) if legacy_time is not None else 'skipped'))
+
+
+if __name__ == '__main__':
+    main()